@@ -0,0 +1,278 @@
+#================================================================================
+#   CIE Colour Gamut Plotter - Batch mode
+#     Copyright (C) 2022  Kampidh
+
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#================================================================================
+
+#
+# Headless batch analysis, walks a directory tree and writes one report row per image:
+# embedded profile details, gamut coverage of the image pixels against the reference
+# gamuts and, optionally, the chromaticity histogram of every image.
+#
+#   python CIEBatch.py <image dir> -o report.csv --workers 8 --gamuts sRGB "Display P3"
+#
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from icctotrcMP import iccToTRC, iccChromaHistogram, iccGamutCoverage
+
+imageExtensions = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.webp', '.jxl', '.exr', '.heic', '.heif', '.avif')
+
+
+def findImages(rootDir: str, extensions = imageExtensions) -> list:
+    found = []
+    for dirPath, dirNames, fileNames in os.walk(rootDir):
+        dirNames.sort()
+        for x in sorted(fileNames):
+            if x.lower().endswith(extensions):
+                found.append(os.path.join(dirPath, x))
+    return found
+
+
+def loadImage(path: str):
+    # same loading as the GUI, returns (RGB pixels, embedded profile bytes or None)
+    import pyvips
+
+    image = pyvips.Image.new_from_file(path, access='sequential')
+    pixels = image.numpy()
+
+    profile = image.get('icc-profile-data') if image.get_typeof('icc-profile-data') != 0 else None
+
+    if pixels.ndim != 3 or pixels.shape[-1] < 3:
+        raise Exception('Only images with RGB model are supported')
+    pixels = pixels[..., 0:3]
+
+    if path.lower().endswith(('.tif', '.tiff')) and pixels.dtype in (np.float32, np.float16):
+        # float tiff files are blown out somehow by pyvips/libvips
+        pixels = pixels / 255
+
+    return pixels, profile
+
+
+def reducePixels(pixels, maxPixels: int):
+    # nearest neighbour, so no new colours are interpolated into the results
+    if maxPixels <= 0 or pixels.shape[0] * pixels.shape[1] <= maxPixels:
+        return pixels
+    step = int(np.ceil(np.sqrt((pixels.shape[0] * pixels.shape[1]) / maxPixels)))
+    return pixels[::step, ::step]
+
+
+def analyseImage(pixels, profile, options: dict) -> dict:
+    result = {
+        'width': int(pixels.shape[1]),
+        'height': int(pixels.shape[0]),
+        'dtype': str(pixels.dtype),
+    }
+
+    pixels = reducePixels(pixels, options['maxPixels'])
+    result['pixels'] = int(pixels.shape[0] * pixels.shape[1])
+
+    # untagged images are treated as sRGB, like the GUI does
+    untagged = profile is None
+    if untagged:
+        prf = untaggedTransform(options['precision'])
+    else:
+        prf = iccToTRC.cached(bytes(profile), precision=options['precision'])
+        if prf.extractColorSpace() != 'RGB':
+            raise Exception(f'{prf.extractColorSpace()} is not supported, use RGB image instead')
+        prf.profileFromEmbed()
+
+    result['profile'] = '' if untagged else prf.prfName
+    result['profileType'] = prf.prfType
+    result['trcType'] = prf.trcType
+    result['knownProfile'] = prf.prfKnown
+    result['iccVersion'] = '' if untagged else prf.prfVer
+    result['whitepoint'] = [float(x) for x in prf.prfWhite]
+    result['primaries'] = np.reshape(prf.primariesCA, (3, 2)).tolist()
+
+    coverage = iccGamutCoverage(options['gamuts'], options['space'])
+    histogram = iccChromaHistogram(options['space'], options['bins']) if options['histogramDir'] else None
+
+    if prf.prfType == 'mab' and pixels.dtype in (np.uint8, np.uint16):
+        # CLUT profiles, every distinct colour is decoded once and weighted by its count
+        unique, counts, inverse = prf.uniqueColours(pixels)
+        coords = prf.trcDecodeChromaticity(unique, options['space'])
+        coverage.update(coords, counts)
+        if histogram is not None:
+            histogram.update(coords, counts)
+    else:
+        tileRows = prf.autoTileRows(pixels)
+        for x in range(0, pixels.shape[0], tileRows):
+            coords = prf.trcDecodeChromaticity(pixels[x:x+tileRows], options['space'])
+            coverage.update(coords)
+            if histogram is not None:
+                histogram.update(coords)
+
+    result['gamut'] = coverage.results()
+    result['profileCoverage'] = coverage.profileCoverage(prf)
+    result['undefinedPixels'] = coverage.undefined
+
+    if histogram is not None:
+        result['histogram'] = histogram
+
+    return result
+
+
+def batchTask(path: str, options: dict) -> dict:
+    # runs in the worker processes, failures are reported instead of raised
+    tA = time.perf_counter()
+    report = {'path': path, 'status': 'ok', 'error': ''}
+
+    try:
+        pixels, profile = loadImage(path)
+        report.update(analyseImage(pixels, profile, options))
+
+        histogram = report.pop('histogram', None)
+        if histogram is not None:
+            report['histogramFile'] = saveHistogram(histogram, path, options)
+    except Exception as e:
+        report['status'] = 'error'
+        report['error'] = str(e)
+
+    report['seconds'] = round(time.perf_counter() - tA, 4)
+    return report
+
+
+def saveHistogram(histogram: iccChromaHistogram, path: str, options: dict) -> str:
+    relPath = os.path.relpath(path, options['rootDir'])
+    outPath = os.path.join(options['histogramDir'], relPath + '.npz')
+    os.makedirs(os.path.dirname(outPath), exist_ok=True)
+
+    np.savez_compressed(outPath, counts=histogram.counts, extent=np.array(histogram.extent), outside=histogram.outside)
+    return outPath
+
+
+untaggedTransforms = {}
+
+def untaggedTransform(precision: str) -> iccToTRC:
+    # reference sRGB primaries, D65 white and transfer function, built once per process
+    if precision not in untaggedTransforms:
+        untaggedTransforms[precision] = iccToTRC.fromReference('sRGB', precision=precision)
+    return untaggedTransforms[precision]
+
+
+#
+# Report writers, csv is flattened to one column per gamut statistic
+#
+def csvColumns(gamuts) -> list:
+    columns = ['path', 'status', 'error', 'width', 'height', 'pixels', 'dtype', 'profile', 'profileType', 'trcType', 'knownProfile', 'iccVersion', 'undefinedPixels']
+    for x in gamuts:
+        columns += [f'{x} inside %', f'{x} outside %', f'{x} outside max distance', f'{x} profile coverage %']
+    return columns + ['histogramFile', 'seconds']
+
+
+def csvRow(report: dict, gamuts) -> dict:
+    row = {x: report.get(x, '') for x in csvColumns(gamuts)}
+    for x in gamuts:
+        if x in report.get('gamut', {}):
+            row[f'{x} inside %'] = round(report['gamut'][x]['insidePercent'], 4)
+            row[f'{x} outside %'] = round(report['gamut'][x]['outsidePercent'], 4)
+            row[f'{x} outside max distance'] = round(report['gamut'][x]['outsideMaxDistance'], 6)
+            row[f'{x} profile coverage %'] = round(report['profileCoverage'][x]['coveragePercent'], 4)
+    return row
+
+
+def runBatch(paths: list, options: dict, outPath: str, outFormat: str, workers: int, log = print) -> list:
+    reports = []
+    csvFile = None
+
+    if outFormat == 'csv':
+        csvFile = open(outPath, 'w', newline='', encoding='utf-8')
+        writer = csv.DictWriter(csvFile, fieldnames=csvColumns(options['gamuts']))
+        writer.writeheader()
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(batchTask, x, options) for x in paths]
+
+            for n, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                report = future.result()
+                reports.append(report)
+                log(f'[{n}/{len(paths)}] {report["status"]}: {report["path"]}' + (f' ({report["error"]})' if report['error'] else ''))
+
+                if csvFile is not None:
+                    # rows are written as they complete, a long run leaves a usable partial report
+                    writer.writerow(csvRow(report, options['gamuts']))
+                    csvFile.flush()
+    finally:
+        if csvFile is not None:
+            csvFile.close()
+
+    if outFormat == 'json':
+        reports.sort(key=lambda x: x['path'])
+        with open(outPath, 'w', encoding='utf-8') as f:
+            json.dump({'options': options, 'images': reports}, f, indent=1)
+
+    return reports
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Headless CIE chromaticity and gamut coverage reports for a directory of images')
+    parser.add_argument('input', help='image directory, searched recursively')
+    parser.add_argument('-o', '--output', default='', help='report file, .json or .csv (default: <input>/CIEBatch_report.json)')
+    parser.add_argument('-w', '--workers', type=int, default=0, help='worker processes (default: cpu count)')
+    parser.add_argument('-s', '--space', choices=['xy', 'uv'], default='xy', help="chromaticity space, CIE 1931 xy or CIE 1976 u'v'")
+    parser.add_argument('-g', '--gamuts', nargs='+', default=['sRGB', 'Display P3', 'ITU-R BT.2020'], choices=list(iccGamutCoverage.referencePrimaries), help='reference gamuts')
+    parser.add_argument('-m', '--max-pixels', type=int, default=0, help='nearest neighbour reduce images above this many pixels (default: full size)')
+    parser.add_argument('-p', '--precision', choices=['float64', 'float32'], default='float32', help='decode precision')
+    parser.add_argument('--histograms', default='', help='also save the chromaticity histogram of every image (npz) below this directory')
+    parser.add_argument('--bins', type=int, default=256, help='histogram bins per axis')
+    parser.add_argument('--extensions', nargs='+', default=list(imageExtensions), help='image file extensions to include')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input):
+        parser.error(f'{args.input} is not a directory')
+
+    outPath = args.output or os.path.join(args.input, 'CIEBatch_report.json')
+    outFormat = 'csv' if outPath.lower().endswith('.csv') else 'json'
+
+    options = {
+        'rootDir': os.path.abspath(args.input),
+        'space': args.space,
+        'gamuts': args.gamuts,
+        'maxPixels': args.max_pixels,
+        'precision': args.precision,
+        'histogramDir': os.path.abspath(args.histograms) if args.histograms else '',
+        'bins': args.bins,
+    }
+
+    paths = findImages(args.input, tuple(x.lower() if x.startswith('.') else '.' + x.lower() for x in args.extensions))
+    if not paths:
+        print('No images found')
+        return 1
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    print(f'Analysing {len(paths)} image(s) with {workers} worker(s)')
+
+    tA = time.perf_counter()
+    reports = runBatch(paths, options, outPath, outFormat, workers)
+    tB = time.perf_counter()
+
+    failed = sum(1 for x in reports if x['status'] != 'ok')
+    print(f'Done in {round(tB - tA, 2)} second(s), {len(reports) - failed} ok, {failed} failed')
+    print(f'Report: {outPath}')
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#================================================================================
+#   CIE Colour Gamut Plotter - Benchmarks
+#     Copyright (C) 2022  Kampidh
+
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#================================================================================
+
+#
+# Performance of iccToTRC over synthetic profiles of every branch and size: constructor
+# time, decode throughput per image size, thread scaling and peak decode memory.
+# Results go to a JSON file, --compare prints the change against an earlier run.
+#
+#   python CIEBenchmark.py -o bench.json
+#   python CIEBenchmark.py -o bench-new.json --compare bench.json
+#
+
+import argparse
+import concurrent.futures
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import iccProfileGen
+from icctotrcMP import iccToTRC
+
+# (case name, synthProfile arguments)
+benchCases = [
+    ('curv-gamma', {'kind': 'curv-gamma'}),
+    ('curv-table-256', {'kind': 'curv-table', 'curveLen': 256}),
+    ('curv-table-4096', {'kind': 'curv-table', 'curveLen': 4096}),
+    ('curv-table-65535', {'kind': 'curv-table', 'curveLen': 65535}),
+    ('para', {'kind': 'para'}),
+    ('sRGB', {'kind': 'sRGB'}),
+    ('mAB-9-8bit', {'kind': 'mAB', 'gridPoints': 9, 'clutBits': 8}),
+    ('mAB-17-16bit', {'kind': 'mAB', 'gridPoints': 17, 'clutBits': 16}),
+    ('mAB-33-16bit', {'kind': 'mAB', 'gridPoints': 33, 'clutBits': 16}),
+    ('mft2-17', {'kind': 'mft2', 'gridPoints': 17}),
+    ('mft2-33', {'kind': 'mft2', 'gridPoints': 33}),
+    ('pq', {'kind': 'pq'}),
+    ('hlg', {'kind': 'hlg'}),
+]
+
+
+def bestOf(func, repeats: int) -> float:
+    # shortest of a few runs, the least disturbed by the rest of the system
+    best = float('inf')
+    for x in range(repeats):
+        tA = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - tA)
+    return best
+
+
+def testImage(megaPixels: float, dtype = 'float'):
+    side = int(np.sqrt(megaPixels * 1e6))
+    rng = np.random.default_rng(0)
+    if dtype == 'uint8':
+        return rng.integers(0, 256, (side, side, 3), dtype=np.uint8)
+    return rng.random((side, side, 3))
+
+
+def decodeThreads(prf: iccToTRC, input, out, threads: int):
+    # row blocks decoded concurrently, each thread writes its own block of out
+    rows = max(1, -(-input.shape[0] // (threads * 4)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(prf.trcDecodeBlock, input[x:x+rows], out[x:x+rows]) for x in range(0, input.shape[0], rows)]
+        for x in futures:
+            x.result()
+
+
+def benchCase(name: str, profile: bytes, options: dict) -> dict:
+    result = {'case': name, 'profileBytes': len(profile)}
+
+    # the well-known profile memo is cleared, so every run times a full construction
+    result['constructSeconds'] = bestOf(lambda: (iccToTRC.clearKnown(), iccToTRC(profile)), options['repeats'])
+    prf = iccToTRC(profile)
+    result['prfType'] = prf.prfType
+    result['trcType'] = prf.trcType
+    result['uniformTRC'] = bool(prf.uniformTRC)
+    result['knownProfile'] = prf.prfKnown
+
+    # decode throughput, megapixels per second
+    decode = {}
+    for size in options['sizes']:
+        input = testImage(size)
+        out = np.empty(input.shape, dtype=float)
+        prf.trcDecode(input, out)
+        seconds = bestOf(lambda: prf.trcDecode(input, out), options['repeats'])
+
+        inputInt = testImage(size, 'uint8')
+        prf.trcDecodeInt(inputInt)
+        secondsInt = bestOf(lambda: prf.trcDecodeInt(inputInt), options['repeats'])
+
+        decode[str(size)] = {
+            'pixels': int(input.shape[0] * input.shape[1]),
+            'floatSeconds': seconds,
+            'floatMPs': input.shape[0] * input.shape[1] / 1e6 / seconds,
+            'uint8Seconds': secondsInt,
+            'uint8MPs': input.shape[0] * input.shape[1] / 1e6 / secondsInt,
+        }
+    result['decode'] = decode
+
+    # thread scaling over row blocks of the largest size
+    input = testImage(max(options['sizes']))
+    out = np.empty(input.shape, dtype=float)
+    scaling = {}
+    for threads in options['threads']:
+        seconds = bestOf(lambda: decodeThreads(prf, input, out, threads), options['repeats'])
+        scaling[str(threads)] = {'seconds': seconds, 'MPs': input.shape[0] * input.shape[1] / 1e6 / seconds}
+    result['threads'] = scaling
+
+    # peak traced allocation of one decode that allocates its own result
+    tracemalloc.start()
+    prf.trcDecode(input)
+    result['decodePeakBytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        commit = ''
+
+    return {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results: dict, baseline: dict):
+    # ratios above 1.0 are faster than the baseline
+    old = {x['case']: x for x in baseline['cases']}
+    print(f'\nCompared with {baseline["environment"].get("commit", "")} ({baseline["environment"].get("time", "")})')
+    print(f'{"case":<20}{"construct":>12}{"float":>12}{"uint8":>12}')
+
+    for case in results['cases']:
+        prev = old.get(case['case'])
+        if prev is None:
+            continue
+        size = max(case['decode'], key=float)
+        if size not in prev['decode']:
+            continue
+        construct = prev['constructSeconds'] / case['constructSeconds']
+        floatRatio = case['decode'][size]['floatMPs'] / prev['decode'][size]['floatMPs']
+        intRatio = case['decode'][size]['uint8MPs'] / prev['decode'][size]['uint8MPs']
+        print(f'{case["case"]:<20}{construct:>11.2f}x{floatRatio:>11.2f}x{intRatio:>11.2f}x')
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='iccToTRC benchmarks over synthetic profiles')
+    parser.add_argument('-o', '--output', default='CIEBenchmark.json', help='result file (default: CIEBenchmark.json)')
+    parser.add_argument('--compare', default='', help='earlier result file to compare against')
+    parser.add_argument('--cases', nargs='+', default=[x[0] for x in benchCases], choices=[x[0] for x in benchCases], help='cases to run')
+    parser.add_argument('--sizes', nargs='+', type=float, default=[0.25, 1.0, 4.0], help='image sizes in megapixels')
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, 2, 4], help='thread counts for the scaling run')
+    parser.add_argument('--repeats', type=int, default=3, help='runs per measurement, the best is kept')
+    parser.add_argument('--quick', action='store_true', help='small sizes and a single run, for a smoke test')
+    args = parser.parse_args(argv)
+
+    options = {
+        'sizes': [0.0625, 0.25] if args.quick else args.sizes,
+        'threads': [1, 2] if args.quick else args.threads,
+        'repeats': 1 if args.quick else args.repeats,
+    }
+
+    results = {'environment': environment(), 'options': options, 'cases': []}
+    np.seterr(all='ignore')
+
+    for name, kwargs in benchCases:
+        if name not in args.cases:
+            continue
+        result = benchCase(name, iccProfileGen.synthProfile(**kwargs), options)
+        results['cases'].append(result)
+
+        size = str(max(options['sizes']))
+        print(f'{name:<20} construct {result["constructSeconds"] * 1000:8.2f} ms | '
+              f'float {result["decode"][size]["floatMPs"]:7.2f} MP/s | uint8 {result["decode"][size]["uint8MPs"]:7.2f} MP/s | '
+              f'peak {result["decodePeakBytes"] / 1e6:7.1f} MB')
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+    print(f'Results: {args.output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
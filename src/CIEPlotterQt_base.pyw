@@ -497,6 +497,9 @@ class MainWindow(QtWidgets.QMainWindow):
             elif trcType == 'A2B0 mft2':
                 self.printLog('TRC type: A2B0 mft2')
 
+            if customProfile.prfKnown:
+                self.printLog(f'Matches {customProfile.prfKnown}, decoded with its closed-form transfer function')
+
             if not customProfile.prfPCS_white_check:
                 self.printLog('Warning: Embedded profile PCS illuminant is not D50')
 
@@ -517,7 +520,18 @@ class MainWindow(QtWidgets.QMainWindow):
 
             tA = time.perf_counter()
 
-            RGBlin = customProfile.trcDecode(RGB)
+            if useAllTRCTags and colorspace_index == 0:
+                # the scatter plot only needs xy, decode straight to it
+                RGBlin = None
+                xyYlin = customProfile.trcDecodeChromaticity(img if img.dtype == np.uint8 or img.dtype == np.uint16 else RGB)
+            elif customProfile.prfType == 'mab' and (img.dtype == np.uint8 or img.dtype == np.uint16):
+                # CLUT profiles, run the transform once per distinct colour
+                RGBlin = customProfile.trcDecodeUnique(img, scatter=True)
+            elif img.dtype == np.uint8 or img.dtype == np.uint16:
+                # decode straight from the integer pixel values
+                RGBlin = customProfile.trcDecodeInt(img)
+            else:
+                RGBlin = customProfile.trcDecode(RGB)
             # RGBlin = np.clip(RGBlin, 0.0, 1024.0)
 
             tB = time.perf_counter()
@@ -534,7 +548,7 @@ class MainWindow(QtWidgets.QMainWindow):
             # tB = time.perf_counter()
             # self.printLog(f'Image TRC decoded in {round(tB-tA, 4)} second(s)')
 
-            if np.any(RGBlin > 1.0):
+            if RGBlin is not None and np.any(RGBlin > 1.0):
                 self.printLog('Detected pixel value with >1.0, possibly an HDR image')
 
         else:
@@ -552,8 +566,6 @@ class MainWindow(QtWidgets.QMainWindow):
             srgb = colour.models.RGB_COLOURSPACE_sRGB
             wtpnt = None
             if autoProfileValid:
-                XYZlin = colour.RGB_to_XYZ(RGBlin, customProfile.prfWhite, customProfile.prfWhite, cProfile.matrix_RGB_to_XYZ)
-                xyYlin = colour.XYZ_to_xy(XYZlin)
                 wtpnt = customProfile.prfWhite
                 xyY2lin = xyYlin.reshape(-1, xyYlin.shape[-1])
                 xyYprim = customProfile.primariesCA
@@ -0,0 +1,399 @@
+#================================================================================
+#   CIE Colour Gamut Plotter - ICC profile catalog
+#     Copyright (C) 2022  Kampidh
+
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#================================================================================
+
+#
+# SQLite index of the ICC profiles in a library of profile files and images. Every
+# profile is parsed once and stored by its content digest, files only point at it,
+# so a re-scan only reads files whose mtime or size changed and only parses profiles
+# whose digest is new. Queries by primaries, white point, TRC type, ICC version and
+# well-known profile then run on the index alone.
+#
+#   python iccCatalog.py scan <dir or file> ... --db profiles.sqlite --workers 8
+#   python iccCatalog.py query --db profiles.sqlite --primaries "Display P3" --trc para
+#
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from CIEBatch import findImages, imageExtensions
+from icctotrcMP import iccToTRC, iccGamutCoverage
+
+profileExtensions = ('.icc', '.icm')
+
+# columns of the profiles table after the digest, in record order
+profileColumns = (
+    'name', 'version', 'colorSpace', 'profileType', 'trcType', 'trcTypes', 'knownProfile',
+    'redX', 'redY', 'greenX', 'greenY', 'blueX', 'blueY', 'whiteX', 'whiteY', 'bytes', 'error',
+)
+
+catalogSchema = '''
+CREATE TABLE IF NOT EXISTS profiles (
+    digest TEXT PRIMARY KEY,
+    name TEXT, version REAL, colorSpace TEXT, profileType TEXT, trcType TEXT, trcTypes TEXT, knownProfile TEXT,
+    redX REAL, redY REAL, greenX REAL, greenY REAL, blueX REAL, blueY REAL, whiteX REAL, whiteY REAL,
+    bytes INTEGER, error TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL, size INTEGER, digest TEXT, kind TEXT, status TEXT, error TEXT, scanned REAL
+);
+CREATE INDEX IF NOT EXISTS profilesPrimaries ON profiles (redX, greenX, blueX);
+CREATE INDEX IF NOT EXISTS profilesWhite ON profiles (whiteX, whiteY);
+CREATE INDEX IF NOT EXISTS profilesTRC ON profiles (trcType);
+CREATE INDEX IF NOT EXISTS profilesVersion ON profiles (version);
+CREATE INDEX IF NOT EXISTS profilesKnown ON profiles (knownProfile);
+CREATE INDEX IF NOT EXISTS filesDigest ON files (digest);
+'''
+catalogVersion = 1
+
+
+#
+# Worker side, runs in the scan processes
+#
+catalogKnown = frozenset()
+
+def catalogInit(knownDigests):
+    # digests already in the catalog when the scan started, those are not parsed again
+    global catalogKnown
+    catalogKnown = frozenset(knownDigests)
+
+
+def loadProfile(path: str):
+    # (profile bytes or None, kind), images only have their header read
+    if path.lower().endswith(profileExtensions):
+        with open(path, 'rb') as f:
+            return f.read(), 'profile'
+
+    import pyvips
+
+    image = pyvips.Image.new_from_file(path)
+    profile = image.get('icc-profile-data') if image.get_typeof('icc-profile-data') != 0 else None
+    return profile, 'image'
+
+
+def profileRecord(profile: bytes) -> dict:
+    # catalog row of one profile, whatever could not be extracted is left as None
+    # everything comes from the lazy metadata and the tags, no curve or CLUT is built,
+    # so the well-known match is only made for matrix/TRC profiles (see fingerprintTags)
+    record = dict.fromkeys(profileColumns)
+    record['bytes'] = len(profile)
+    record['error'] = ''
+
+    try:
+        prf = iccToTRC(profile, lazy=True)
+        record['name'] = prf.prfName
+        record['version'] = prf.prfVer
+        record['colorSpace'] = prf.extractColorSpace()
+        record['profileType'] = prf.prfType
+
+        if prf.prfType == '' or record['colorSpace'] != 'RGB':
+            # gray, CMYK, device link ... are listed by their header only
+            return record
+
+        record['trcType'] = prf.trcType
+        record['trcTypes'] = ','.join(prf.findTagType(x) for x in ('rTRC', 'gTRC', 'bTRC')) if prf.prfType == 'std' else prf.trcType
+        record['knownProfile'] = prf.fingerprintTags()
+
+        primaries = prf.primariesFromTags()
+        adapted = prf.adaptedChromaticities(primaries) if primaries is not None else None
+        if adapted is not None:
+            record['redX'], record['redY'], record['greenX'], record['greenY'], record['blueX'], record['blueY'] = [float(x) for x in np.ravel(adapted[0])]
+            record['whiteX'], record['whiteY'] = [float(x) for x in np.ravel(adapted[1])]
+    except Exception as e:
+        record['error'] = str(e)
+
+    return record
+
+
+def catalogTask(path: str, mtime: float, size: int) -> dict:
+    # failures are reported instead of raised, like the batch mode
+    report = {'path': path, 'mtime': mtime, 'size': size, 'digest': None, 'kind': '', 'status': 'ok', 'error': '', 'record': None}
+
+    try:
+        profile, report['kind'] = loadProfile(path)
+        if profile is None:
+            report['status'] = 'untagged'
+            return report
+
+        profile = bytes(profile)
+        report['digest'] = iccToTRC.profileDigest(profile)
+        if report['digest'] not in catalogKnown:
+            report['record'] = profileRecord(profile)
+    except Exception as e:
+        report['status'] = 'error'
+        report['error'] = str(e)
+
+    return report
+
+
+#
+# Catalog
+#
+class iccCatalog:
+    # scan results written per transaction
+    commitEvery = 256
+
+    def __init__(self, dbPath: str):
+        self.dbPath = dbPath
+        self.db = sqlite3.connect(dbPath)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, catalogVersion):
+            raise Exception(f'Catalog {dbPath} has version {version}, expected {catalogVersion}')
+        self.db.executescript(catalogSchema)
+        self.db.execute(f'PRAGMA user_version={catalogVersion}')
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def findFiles(self, roots, extensions) -> list:
+        # files given directly are taken whatever their extension
+        found = []
+        for x in roots:
+            if os.path.isdir(x):
+                found += findImages(x, extensions)
+            elif os.path.isfile(x):
+                found.append(x)
+            else:
+                raise Exception(f'{x} is not a file or directory')
+        return sorted(set(os.path.abspath(x) for x in found))
+
+    def scan(self, roots, extensions = profileExtensions + imageExtensions, workers: int = 0, prune: bool = True, log = print) -> dict:
+        # roots: directories (searched recursively) and files
+        # prune: forget files under the scanned directories that are gone
+        tA = time.perf_counter()
+        paths = self.findFiles(roots, extensions)
+
+        stored = {x['path']: (x['mtime'], x['size']) for x in self.db.execute('SELECT path, mtime, size FROM files')}
+        todo = []
+        for x in paths:
+            stat = os.stat(x)
+            if stored.get(x) != (stat.st_mtime, stat.st_size):
+                todo.append((x, stat.st_mtime, stat.st_size))
+
+        counts = {'files': len(paths), 'unchanged': len(paths) - len(todo), 'scanned': 0, 'added': 0, 'untagged': 0, 'failed': 0, 'removed': 0}
+        knownDigests = {x[0] for x in self.db.execute('SELECT digest FROM profiles')}
+
+        if todo:
+            workers = workers if workers > 0 else (os.cpu_count() or 1)
+            log(f'Scanning {len(todo)} of {len(paths)} file(s) with {workers} worker(s)')
+
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=catalogInit, initargs=(knownDigests,)) as pool:
+                futures = [pool.submit(catalogTask, *x) for x in todo]
+
+                for n, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    report = future.result()
+                    counts['scanned'] += 1
+                    counts['added'] += self.storeReport(report, knownDigests)
+                    counts['untagged'] += report['status'] == 'untagged'
+                    # unreadable files, and profiles that could only be partly parsed
+                    error = report['error'] or (report['record'] or {}).get('error')
+                    counts['failed'] += bool(error)
+                    if error:
+                        log(f'[{n}/{len(todo)}] error: {report["path"]} ({error})')
+
+                    if n % self.commitEvery == 0:
+                        self.db.commit()
+            self.db.commit()
+
+        if prune:
+            counts['removed'] = self.prune([os.path.abspath(x) for x in roots if os.path.isdir(x)], paths)
+
+        counts['seconds'] = round(time.perf_counter() - tA, 4)
+        return counts
+
+    def storeReport(self, report: dict, knownDigests: set) -> bool:
+        # True if the report added a new profile to the catalog
+        record = report['record']
+        added = record is not None and report['digest'] not in knownDigests
+        if added:
+            # the same new profile can come from several files of one scan
+            knownDigests.add(report['digest'])
+            self.db.execute(
+                f'INSERT OR REPLACE INTO profiles (digest, {", ".join(profileColumns)}) VALUES ({", ".join("?" * (len(profileColumns) + 1))})',
+                [report['digest']] + [record[x] for x in profileColumns]
+            )
+
+        self.db.execute(
+            'INSERT OR REPLACE INTO files (path, mtime, size, digest, kind, status, error, scanned) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (report['path'], report['mtime'], report['size'], report['digest'], report['kind'], report['status'], report['error'], time.time())
+        )
+        return added
+
+    def prune(self, rootDirs, paths) -> int:
+        present = set(paths)
+        gone = []
+        for root in rootDirs:
+            prefix = os.path.join(root, '')
+            rows = self.db.execute('SELECT path FROM files WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))
+            gone += [x[0] for x in rows if x[0] not in present]
+
+        self.db.executemany('DELETE FROM files WHERE path = ?', [(x,) for x in gone])
+        self.db.execute('DELETE FROM profiles WHERE digest NOT IN (SELECT digest FROM files WHERE digest IS NOT NULL)')
+        self.db.commit()
+        return len(gone)
+
+    def query(self, primaries = None, white = None, tolerance: float = 0.005, trcType: str = '', version: str = '',
+              knownProfile: str = '', colorSpace: str = '', byFile: bool = True) -> list:
+        # primaries: reference name (iccGamutCoverage.referencePrimaries) or ((x, y), (x, y), (x, y))
+        # white: (x, y), tolerance applies to every xy coordinate
+        # version: '4' matches every v4 profile, '4.3' only v4.3
+        # byFile: one row per file, else one row per profile with its file count
+        where = []
+        args = []
+
+        if primaries is not None:
+            if isinstance(primaries, str):
+                if primaries not in iccGamutCoverage.referencePrimaries:
+                    raise Exception(f'Unknown primaries {primaries}')
+                primaries = iccGamutCoverage.referencePrimaries[primaries]
+            for channel, xy in zip(('red', 'green', 'blue'), primaries):
+                where += [f'{channel}X BETWEEN ? AND ?', f'{channel}Y BETWEEN ? AND ?']
+                args += [xy[0] - tolerance, xy[0] + tolerance, xy[1] - tolerance, xy[1] + tolerance]
+
+        if white is not None:
+            where += ['whiteX BETWEEN ? AND ?', 'whiteY BETWEEN ? AND ?']
+            args += [white[0] - tolerance, white[0] + tolerance, white[1] - tolerance, white[1] + tolerance]
+
+        if trcType:
+            where.append('trcType = ? COLLATE NOCASE')
+            args.append(trcType)
+
+        if version:
+            if '.' in version:
+                where.append('version BETWEEN ? AND ?')
+                args += [float(version) - 0.0005, float(version) + 0.0005]
+            else:
+                where.append('version >= ? AND version < ?')
+                args += [int(version), int(version) + 1]
+
+        if knownProfile:
+            where.append('knownProfile = ? COLLATE NOCASE')
+            args.append(knownProfile)
+
+        if colorSpace:
+            where.append('colorSpace = ? COLLATE NOCASE')
+            args.append(colorSpace)
+
+        condition = ' WHERE ' + ' AND '.join(where) if where else ''
+        if byFile:
+            sql = f'SELECT files.path, files.kind, profiles.* FROM profiles JOIN files ON files.digest = profiles.digest{condition} ORDER BY files.path'
+        else:
+            sql = f'SELECT profiles.*, (SELECT COUNT(*) FROM files WHERE files.digest = profiles.digest) AS files FROM profiles{condition} ORDER BY name'
+
+        return [dict(x) for x in self.db.execute(sql, args)]
+
+    def summary(self) -> dict:
+        return {
+            'files': self.db.execute('SELECT COUNT(*) FROM files').fetchone()[0],
+            'profiles': self.db.execute('SELECT COUNT(*) FROM profiles').fetchone()[0],
+            'untagged': self.db.execute("SELECT COUNT(*) FROM files WHERE status = 'untagged'").fetchone()[0],
+            'failed': self.db.execute("SELECT COUNT(*) FROM files WHERE status = 'error'").fetchone()[0],
+        }
+
+
+#
+# Command line
+#
+def printRows(rows: list, outFormat: str):
+    if outFormat == 'json':
+        print(json.dumps(rows, indent=1))
+    elif outFormat == 'csv':
+        if rows:
+            writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        for x in rows:
+            primaries = '' if x['redX'] is None else ' '.join(f'{x[c]:.4f}' for c in ('redX', 'redY', 'greenX', 'greenY', 'blueX', 'blueY'))
+            white = '' if x['whiteX'] is None else f'{x["whiteX"]:.4f} {x["whiteY"]:.4f}'
+            head = x['path'] if 'path' in x else f'{x["files"]} file(s)'
+            print(f'{head} | {x["name"]} | v{x["version"]} {x["colorSpace"]} {x["trcTypes"] or x["trcType"] or ""} '
+                  f'{x["knownProfile"] or ""} | {primaries} | {white}' + (f' | {x["error"]}' if x['error'] else ''))
+        print(f'{len(rows)} match(es)')
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='SQLite catalog of the ICC profiles in profile files and images')
+    parser.add_argument('--db', default='iccCatalog.sqlite', help='catalog file (default: iccCatalog.sqlite)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scanParser = commands.add_parser('scan', help='add or refresh files, only changed files are read again')
+    scanParser.add_argument('input', nargs='+', help='directories (searched recursively) and files')
+    scanParser.add_argument('-w', '--workers', type=int, default=0, help='worker processes (default: cpu count)')
+    scanParser.add_argument('--extensions', nargs='+', default=list(profileExtensions + imageExtensions), help='file extensions to include')
+    scanParser.add_argument('--no-prune', action='store_true', help='keep files that are gone from the scanned directories')
+
+    queryParser = commands.add_parser('query', help='list files or profiles matching every given condition')
+    queryParser.add_argument('--primaries', nargs='+', default=None, help=f'reference name ({", ".join(iccGamutCoverage.referencePrimaries)}) or six xy values R G B')
+    queryParser.add_argument('--white', nargs=2, type=float, default=None, help='white point xy')
+    queryParser.add_argument('--tolerance', type=float, default=0.005, help='largest xy difference of primaries and white point')
+    queryParser.add_argument('--trc', default='', help='TRC type: curv, para, A2B0 mAB or A2B0 mft2')
+    queryParser.add_argument('--version', default='', help="ICC version, '4' or '4.3'")
+    queryParser.add_argument('--known', default='', help='well-known profile match of matrix/TRC profiles, e.g. sRGB or "Display P3"')
+    queryParser.add_argument('--space', default='', help='profile colour space, e.g. RGB, GRAY, CMYK')
+    queryParser.add_argument('--profiles', action='store_true', help='one row per distinct profile instead of per file')
+    queryParser.add_argument('-f', '--format', choices=['text', 'csv', 'json'], default='text', help='output format')
+
+    args = parser.parse_args(argv)
+
+    with iccCatalog(args.db) as catalog:
+        if args.command == 'scan':
+            extensions = tuple(x.lower() if x.startswith('.') else '.' + x.lower() for x in args.extensions)
+            counts = catalog.scan(args.input, extensions, args.workers, not args.no_prune)
+            print(f'Done in {counts["seconds"]} second(s): {counts["files"]} file(s), {counts["unchanged"]} unchanged, '
+                  f'{counts["scanned"]} read, {counts["added"]} new profile(s), {counts["untagged"]} untagged, '
+                  f'{counts["failed"]} failed, {counts["removed"]} removed')
+            summary = catalog.summary()
+            print(f'Catalog: {summary["files"]} file(s), {summary["profiles"]} distinct profile(s)')
+            return 1 if counts['failed'] else 0
+
+        primaries = args.primaries
+        if primaries is not None:
+            if len(primaries) == 1:
+                primaries = primaries[0]
+            elif len(primaries) == 6:
+                primaries = [(float(primaries[x]), float(primaries[x+1])) for x in range(0, 6, 2)]
+            else:
+                parser.error('--primaries takes a reference name or six xy values')
+
+        rows = catalog.query(primaries, args.white, args.tolerance, args.trc, args.version, args.known, args.space, not args.profiles)
+        printRows(rows, args.format)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#================================================================================
+#   CIE Colour Gamut Plotter - Synthetic ICC profiles
+#     Copyright (C) 2022  Kampidh
+
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#================================================================================
+
+#
+# Builds small but valid RGB display profiles for every branch iccToTRC handles:
+# matrix/TRC with curv gamma, curv table or para curves, and A2B0 as mAB or mft2,
+# plus PQ and HLG mAB profiles for the well-known profile fast path.
+# Used for the untagged sRGB fallback of the batch mode and by the benchmarks.
+#
+
+import struct
+
+import numpy as np
+
+from icctotrcMP import iccToTRC
+
+# D50 adapted sRGB colorants (columns of the RGB to PCS matrix) and the D50 PCS white
+sRGBColorants = ((0.4361, 0.2225, 0.0139), (0.3851, 0.7169, 0.0971), (0.1431, 0.0606, 0.7141))
+whiteD50 = (0.9642, 1.0, 0.8249)
+# every profile here is a D65 display profile, the chad tag takes the D65 media white
+# to the D50 PCS (v4 profiles store the PCS white as wtpt), profileFromEmbed undoes it
+whiteD65 = (0.3127 / 0.3290, 1.0, (1 - 0.3127 - 0.3290) / 0.3290)
+chadD65 = iccToTRC.bradfordToD50(whiteD65)
+
+# para function type 3 parameters of the sRGB TRC, and of an sRGB-like 2.2 curve that
+# no well-known profile matches, so the generic para evaluation is what gets measured
+sRGBPara = (2.4, 1 / 1.055, 0.055 / 1.055, 1 / 12.92, 0.04045)
+synthPara = (2.2, 1 / 1.055, 0.055 / 1.055, 1 / 12.92, 0.04045)
+
+
+def s15Fixed16(values) -> bytes:
+    return b''.join(struct.pack('>l', int(round(x * 65536))) for x in values)
+
+def pad4(data: bytes) -> bytes:
+    return data + bytes(-len(data) % 4)
+
+
+#
+# Tag types
+#
+def tagDesc(name: str) -> bytes:
+    # v2 textDescriptionType, empty unicode and scriptcode parts
+    ascii = name.encode('ascii', 'replace') + b'\x00'
+    return pad4(b'desc\x00\x00\x00\x00' + struct.pack('>L', len(ascii)) + ascii + bytes(12 + 67))
+
+def tagXYZ(xyz) -> bytes:
+    return b'XYZ \x00\x00\x00\x00' + s15Fixed16(xyz)
+
+def tagSF32(matrix) -> bytes:
+    return b'sf32\x00\x00\x00\x00' + s15Fixed16(np.ravel(matrix))
+
+def tagCurvGamma(gamma: float) -> bytes:
+    return b'curv\x00\x00\x00\x00' + struct.pack('>LH', 1, int(round(gamma * 256)))
+
+def tagCurvTable(values) -> bytes:
+    values = np.clip(np.asarray(values, dtype=float), 0, 1)
+    return pad4(b'curv\x00\x00\x00\x00' + struct.pack('>L', len(values)) + np.round(values * 65535).astype('>u2').tobytes())
+
+def tagCurvIdentity() -> bytes:
+    return b'curv\x00\x00\x00\x00\x00\x00\x00\x00'
+
+def tagPara(mode: int, params) -> bytes:
+    return pad4(b'para\x00\x00\x00\x00' + struct.pack('>H', mode) + b'\x00\x00' + s15Fixed16(params))
+
+
+def gridTable(gridPoints: int) -> np.ndarray:
+    # smooth, slightly non linear (n, n, n, 3) CLUT in the 0..1 range
+    grid = np.linspace(0, 1, gridPoints)
+    r, g, b = np.meshgrid(grid, grid, grid, indexing='ij')
+    return np.clip(np.stack([r ** 1.1 * 0.9 + 0.05 * g, g * 0.95 + 0.02 * b ** 2, b ** 0.9], axis=-1), 0, 1)
+
+def identityTable(gridPoints: int) -> np.ndarray:
+    grid = np.linspace(0, 1, gridPoints)
+    return np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), axis=-1)
+
+def tagMAB(aCurves, gridPoints: int = 17, clutBits: int = 16, mCurves = None, matrix = None, table = None) -> bytes:
+    # lutAtoBType, A curves -> CLUT -> M curves -> matrix -> identity B curves
+    # table: (n, n, n, 3) CLUT in the 0..1 range, gridTable(gridPoints) by default
+    mCurves = mCurves if mCurves is not None else [tagCurvIdentity()] * 3
+    matrix = matrix if matrix is not None else np.array(sRGBColorants).T
+
+    bData = b''.join(pad4(tagCurvIdentity()) for x in range(3))
+    mtxData = s15Fixed16(list(np.ravel(matrix)) + [0, 0, 0])
+    mData = b''.join(pad4(x) for x in mCurves)
+
+    table = table if table is not None else gridTable(gridPoints)
+    gridPoints = table.shape[0]
+    if clutBits == 8:
+        clutValues = np.round(table * 255).astype('u1').tobytes()
+    else:
+        clutValues = np.round(table * 65535).astype('>u2').tobytes()
+    clutData = pad4(bytes([gridPoints] * 3) + bytes(13) + bytes([1 if clutBits == 8 else 2]) + bytes(3) + clutValues)
+    aData = b''.join(pad4(x) for x in aCurves)
+
+    offB = 32
+    offMtx = offB + len(bData)
+    offM = offMtx + len(mtxData)
+    offClut = offM + len(mData)
+    offA = offClut + len(clutData)
+
+    return (b'mAB \x00\x00\x00\x00' + bytes([3, 3, 0, 0]) + struct.pack('>5L', offB, offMtx, offM, offClut, offA)
+            + bData + mtxData + mData + clutData + aData)
+
+def tagMFT2(gridPoints: int = 17, inLen: int = 256, outLen: int = 256, inGammas = (2.2, 2.2, 2.2)) -> bytes:
+    # lut16Type, input tables -> CLUT (linear RGB to PCS XYZ, halved) -> identity output tables
+    x = np.linspace(0, 1, inLen)
+    inTables = b''.join(np.round(x ** g * 65535).astype('>u2').tobytes() for g in inGammas)
+
+    grid = np.linspace(0, 1, gridPoints)
+    rgb = np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), axis=-1)
+    clutValues = np.round((rgb @ np.array(sRGBColorants)) / 2 * 65535).astype('>u2').tobytes()
+
+    outTables = np.round(np.linspace(0, 1, outLen) * 65535).astype('>u2').tobytes() * 3
+
+    return (b'mft2\x00\x00\x00\x00' + bytes([3, 3, gridPoints, 0]) + s15Fixed16(np.eye(3).ravel())
+            + struct.pack('>HH', inLen, outLen) + inTables + clutValues + outTables)
+
+
+#
+# Profiles
+#
+def buildProfile(tags, version = (4, 0x30)) -> bytes:
+    # tags: list of (signature, tag data), the same data object is stored once and shared
+    offset = 128 + 4 + 12 * len(tags)
+    table = b''
+    data = b''
+    shared = {}
+
+    for sig, tag in tags:
+        if id(tag) not in shared:
+            shared[id(tag)] = (offset + len(data), len(tag))
+            data += pad4(tag)
+        table += sig.encode('ascii') + struct.pack('>LL', *shared[id(tag)])
+
+    header = bytearray(128)
+    header[0:4] = struct.pack('>L', offset + len(data))
+    header[8:10] = bytes(version)
+    header[12:16] = b'mntr'
+    header[16:20] = b'RGB '
+    header[20:24] = b'XYZ '
+    header[36:40] = b'acsp'
+    header[68:80] = s15Fixed16(whiteD50)
+
+    return bytes(header) + struct.pack('>L', len(tags)) + table + data
+
+def matrixTRCProfile(rTRC: bytes, gTRC: bytes = None, bTRC: bytes = None, name: str = 'Synthetic matrix/TRC', colorants = sRGBColorants, version = (4, 0x30)) -> bytes:
+    gTRC = gTRC if gTRC is not None else rTRC
+    bTRC = bTRC if bTRC is not None else rTRC
+    return buildProfile([
+        ('desc', tagDesc(name)),
+        ('wtpt', tagXYZ(whiteD50)),
+        ('rXYZ', tagXYZ(colorants[0])),
+        ('gXYZ', tagXYZ(colorants[1])),
+        ('bXYZ', tagXYZ(colorants[2])),
+        ('rTRC', rTRC),
+        ('gTRC', gTRC),
+        ('bTRC', bTRC),
+        ('chad', tagSF32(chadD65)),
+    ], version)
+
+def a2b0Profile(a2b0: bytes, name: str = 'Synthetic A2B0') -> bytes:
+    return buildProfile([
+        ('desc', tagDesc(name)),
+        ('wtpt', tagXYZ(whiteD50)),
+        ('A2B0', a2b0),
+        ('chad', tagSF32(chadD65)),
+    ])
+
+def sRGBProfile() -> bytes:
+    return matrixTRCProfile(tagPara(3, sRGBPara), name='sRGB', version=(2, 0x10))
+
+
+def pqEOTF(x) -> np.ndarray:
+    # SMPTE ST 2084, 1.0 is 10000 cd/m2
+    m1, m2, c1, c2, c3 = 2610 / 16384, 2523 / 32, 107 / 128, 2413 / 128, 2392 / 128
+    p = np.power(x, 1 / m2)
+    return np.power(np.maximum(p - c1, 0) / (c2 - c3 * p), 1 / m1)
+
+def hlgInverseOETF(x) -> np.ndarray:
+    # ARIB STD-B67, scene linear
+    a = 0.17883277
+    b = 1 - 4 * a
+    c = 0.5 - a * np.log(4 * a)
+    return np.where(x <= 0.5, x * x / 3, (np.exp((x - c) / a) + b) / 12)
+
+def hdrProfile(eotf, curveLen: int = 4096, name: str = 'Synthetic HDR') -> bytes:
+    # BT.2020 mAB with the transfer function as A curves and an identity CLUT,
+    # the same layout as the PNG PQ / HLG profiles the A2B0 path was written for
+    aCurve = tagCurvTable(eotf(np.linspace(0, 1, curveLen)))
+    matrix = iccToTRC.knownColorants('ITU-R BT.2020').T
+    return a2b0Profile(tagMAB([aCurve] * 3, matrix=matrix, table=identityTable(2)), name)
+
+
+def synthProfile(kind: str, curveLen: int = 4096, gridPoints: int = 17, clutBits: int = 16) -> bytes:
+    # kind: 'curv-gamma', 'curv-table', 'para', 'sRGB', 'mAB', 'mft2', 'pq' or 'hlg'
+    # curveLen: entries of curv tables (matrix/TRC and mAB A curves) and mft2 input tables
+    if kind == 'curv-gamma':
+        return matrixTRCProfile(tagCurvGamma(2.2), name='Synthetic curv gamma')
+    elif kind == 'curv-table':
+        return matrixTRCProfile(tagCurvTable(np.linspace(0, 1, curveLen) ** 2.2), name=f'Synthetic curv {curveLen}')
+    elif kind == 'para':
+        return matrixTRCProfile(tagPara(3, synthPara), name='Synthetic para')
+    elif kind == 'sRGB':
+        return sRGBProfile()
+    elif kind == 'mAB':
+        aCurve = tagCurvTable(np.linspace(0, 1, curveLen) ** 2.0)
+        return a2b0Profile(tagMAB([aCurve] * 3, gridPoints, clutBits, [tagPara(0, [1.0])] * 3), f'Synthetic mAB {gridPoints} {clutBits}bit')
+    elif kind == 'mft2':
+        return a2b0Profile(tagMFT2(gridPoints, min(curveLen, 4096)), f'Synthetic mft2 {gridPoints}')
+    elif kind == 'pq':
+        return hdrProfile(pqEOTF, curveLen, 'Synthetic BT.2100 PQ')
+    elif kind == 'hlg':
+        return hdrProfile(hlgInverseOETF, curveLen, 'Synthetic BT.2100 HLG')
+    else:
+        raise Exception(f'Unknown synthetic profile kind {kind}')
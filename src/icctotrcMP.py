@@ -16,24 +16,523 @@
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #================================================================================
 
+import atexit
+import hashlib
+import json
+import mmap
+import os
 import struct
+import tempfile
+import threading
+import time
+import tracemalloc
 import warnings
 
-import colour
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
+
 import numpy as np
-from numpy import vectorize
 
 from numpy.linalg import inv
-from scipy import interpolate
 
-import concurrent.futures
+# colour-science, scipy, concurrent.futures and multiprocessing are imported where
+# they are first needed (colourspace building, the raw table fallback, the worker
+# pools), parsing and decoding a profile only needs numpy
+if TYPE_CHECKING:
+    import colour
 
 # debug only
 # import matplotlib.pyplot as plt
 
+#
+# A2B0 colour lookup table
+#
+# The grid is kept as one contiguous (n, n, n, 3) array, lookups work on the flattened
+# table with precomputed strides. Tetrahedral interpolation is used by default as
+# recommended by the ICC, trilinear is still available as a fallback.
+#
+class iccCLUT:
+    # number of pixels interpolated at once, keeps the temporaries cache sized
+    chunkLen = 65536
+
+    def __init__(self, table, method: str = 'tetrahedral', dtype = float):
+        if method not in ('tetrahedral', 'trilinear'):
+            raise Exception(f'CLUT interpolation {method} is not supported')
+
+        # dtype of the stored grid, lookups are computed in it as well
+        self.table = np.ascontiguousarray(table, dtype=dtype)
+        self.method = method
+
+        self.gridMax = np.array(self.table.shape[:3]) - 1
+        self.gridScale = self.gridMax.astype(self.table.dtype)
+        self.gridStrides = np.array([self.table.shape[1] * self.table.shape[2], self.table.shape[2], 1])
+        self.tableFlat = self.table.reshape(-1, 3)
+
+        # tetrahedral lookups work per axis and per output channel on 1D planes,
+        # numpy is far slower across the three values of a pixel than along an array.
+        # Cells are indexed up to the second last grid point, the upper edge is then
+        # reached with a fraction of 1.0 and the far vertex is always one cell away.
+        self.tablePlanes = np.ascontiguousarray(self.tableFlat.T)
+        self.cellMax = np.maximum(self.gridMax - 1, 0)
+        self.cellStrides = self.gridStrides * (self.gridMax > 0)
+
+    @classmethod
+    def fromBuffer(cls, byteIn, gridPoints, precision: int, method: str = 'tetrahedral', dtype = float):
+        # precision 1: uInt8, 2: big-endian uInt16
+        gridPoints = [int(x) for x in gridPoints]
+        gridLen = gridPoints[0] * gridPoints[1] * gridPoints[2] * 3
+
+        if precision == 1:
+            table = np.frombuffer(byteIn, dtype='u1', count=gridLen) / 255
+        elif precision == 2:
+            table = np.frombuffer(byteIn, dtype='>u2', count=gridLen) / 65535
+        else:
+            raise Exception(f'CLUT precision {precision} is not supported')
+
+        return cls(table.reshape(gridPoints + [3]), method, dtype)
+
+    @classmethod
+    def identity(cls, method: str = 'tetrahedral', dtype = float):
+        grid = np.array([0, 1], dtype=float)
+        table = np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), axis=-1)
+        return cls(table, method, dtype)
+
+    def apply(self, input, method: str = '', out = None):
+        method = method if method else self.method
+
+        input = np.asarray(input)
+        inFlat = input.reshape(-1, 3)
+
+        if out is None:
+            out = np.empty(input.shape, dtype=self.table.dtype)
+        # out may be input itself, each chunk is read completely before it is written
+        outFlat = out.reshape(-1, 3) if out.flags.c_contiguous else np.empty(inFlat.shape, dtype=out.dtype)
+
+        for x in range(0, inFlat.shape[0], self.chunkLen):
+            chunk = inFlat[x:x+self.chunkLen]
+            if method == 'tetrahedral':
+                outFlat[x:x+self.chunkLen] = self.tetrahedralChunk(chunk)
+            else:
+                outFlat[x:x+self.chunkLen] = self.trilinearChunk(chunk)
+
+        if not out.flags.c_contiguous:
+            out[...] = outFlat.reshape(out.shape)
+
+        return out
+
+    def gridPos(self, chunk):
+        # base vertex, per axis step to the next vertex (0 on the upper edge)
+        # and fractional position inside the cell
+        inScaled = np.clip(chunk, 0, 1, dtype=self.table.dtype) * self.gridScale
+
+        # NaN casts to an arbitrary index, clipped back into the grid
+        with np.errstate(invalid='ignore'):
+            i_f = np.clip(inScaled.astype(int), 0, self.gridMax)
+        i_c = np.minimum(i_f + 1, self.gridMax)
+
+        frac = inScaled - i_f.astype(self.table.dtype)
+        base = i_f @ self.gridStrides
+        steps = (i_c - i_f) * self.gridStrides
+
+        return base, steps, frac
+
+    def tetrahedralChunk(self, chunk):
+        chunkLen = chunk.shape[0]
+        frac = np.empty((3, chunkLen), dtype=self.table.dtype)
+        ndx = np.empty((3, chunkLen), dtype=np.intp)
+        np.clip(chunk.T, 0, 1, out=frac)
+
+        for x in range(3):
+            frac[x] *= self.gridScale[x]
+            # NaN casts to an arbitrary index, clipped back into the grid
+            with np.errstate(invalid='ignore'):
+                np.copyto(ndx[x], frac[x], casting='unsafe')
+            np.clip(ndx[x], 0, self.cellMax[x], out=ndx[x])
+        frac -= ndx
+
+        base = ndx[0] * self.gridStrides[0]
+        base += ndx[1] * self.gridStrides[1]
+        base += ndx[2]
+
+        # walk from the base vertex to the far vertex along the axes in order of
+        # decreasing fraction, this selects one of the six tetrahedra. Only the axes
+        # with the largest and smallest fraction are needed, ties pick distinct axes.
+        fx, fy, fz = frac
+        sx, sy, sz = self.cellStrides
+        f1 = np.maximum(fx, fy)
+        np.maximum(f1, fz, out=f1)
+        f3 = np.minimum(fx, fy)
+        np.minimum(f3, fz, out=f3)
+        f2 = fx + fy
+        f2 += fz
+        f2 -= f1
+        f2 -= f3
+
+        xGy = fx >= fy
+        v1 = np.where(xGy & (fx >= fz), sx, np.where(fy >= fz, sy, sz))
+        v1 += base
+        v3 = base + (sx + sy + sz)
+        v2 = v3 - np.where((fz <= fy) & (fz <= fx), sz, np.where(xGy, sy, sx))
+
+        # weights of base, v1, v2 and v3
+        w0 = 1 - f1
+        f1 -= f2
+        f2 -= f3
+
+        result = np.empty((3, chunkLen), dtype=self.table.dtype)
+        tmp = np.empty(chunkLen, dtype=self.table.dtype)
+        for x in range(3):
+            plane = self.tablePlanes[x]
+            res = result[x]
+            np.take(plane, base, out=res)
+            res *= w0
+            for v, w in ((v1, f1), (v2, f2), (v3, f3)):
+                np.take(plane, v, out=tmp)
+                tmp *= w
+                res += tmp
+
+        return result.T
+
+    def trilinearChunk(self, chunk):
+        base, steps, frac = self.gridPos(chunk)
+
+        t = self.tableFlat
+        dx, dy, dz = frac[:, 0:1], frac[:, 1:2], frac[:, 2:3]
+        sx, sy, sz = steps[:, 0], steps[:, 1], steps[:, 2]
+
+        c00 = t[base] * (1 - dz) + t[base + sz] * dz
+        c01 = t[base + sy] * (1 - dz) + t[base + sy + sz] * dz
+        c10 = t[base + sx] * (1 - dz) + t[base + sx + sz] * dz
+        c11 = t[base + sx + sy] * (1 - dz) + t[base + sx + sy + sz] * dz
+
+        c0 = c00 * (1 - dy) + c01 * dy
+        c1 = c10 * (1 - dy) + c11 * dy
+
+        return c0 * (1 - dx) + c1 * dx
+
+
+#
+# 1D curve on a uniform grid (curv tables, para LUTs and mft2 tables are always uniform)
+#
+# The table index is computed arithmetically and linearly interpolated, values outside
+# 0.0 - 1.0 are linearly extrapolated from the first / last segment (HDR).
+#
+class iccCurve:
+    def __init__(self, table, dtype = float):
+        # table: [x, y] as returned by the table builders, only y is kept
+        self.lutY = np.ascontiguousarray(table[1], dtype=dtype)
+        self.lutSlope = np.diff(self.lutY)
+        self.lutScale = len(self.lutY) - 1
+
+    def apply(self, input, out = None, pos = None, ndx = None, val = None):
+        # pos, val (float) and ndx (intp) are optional contiguous scratch buffers shaped like input
+        pos = np.multiply(input, self.lutScale, out=pos, dtype=self.lutY.dtype)
+
+        # NaN casts to an arbitrary index, clipped back into range below
+        with np.errstate(invalid='ignore'):
+            if ndx is None:
+                ndx = pos.astype(np.intp)
+            else:
+                np.copyto(ndx, pos, casting='unsafe')
+        np.clip(ndx, 0, self.lutScale - 1, out=ndx)
+
+        pos -= ndx
+        val = np.take(self.lutSlope, ndx, out=val, mode='clip')
+        val *= pos
+        np.take(self.lutY, ndx, out=pos, mode='clip')
+
+        # out can be a strided channel view, only written once here
+        return np.add(val, pos, out=out)
+
+
+#
+# Inverse of a monotone 1D table, used to encode linear values back through curv
+# tables and mft2 input tables
+#
+# The forward table is made non-decreasing (running maximum) so it has an inverse, which
+# is sampled once into a dense table that is uniform in sqrt of the normalised value,
+# dense near black where the inverse of a gamma-like curve is steepest. Lookups then run
+# through iccCurve. Values outside the table range are linearly extrapolated with the
+# first / last forward segment, the exact inverse of the iccCurve extrapolation.
+#
+class iccInverseCurve:
+    # dense table entries
+    inverseSize = 16384
+
+    def __init__(self, lutX, limits, dtype = float):
+        # lutX: inverse table over sqrt((y - low) / (high - low)) from 0.0 to 1.0
+        # limits: low, high, slope below low and slope above high (dx / dy)
+        self.curve = iccCurve([None, lutX], dtype)
+        self.limits = tuple(float(x) for x in limits)
+
+        low, high = self.limits[0:2]
+        self.lutLow = low
+        self.lutNorm = 1 / (high - low) if high > low else 0.0
+
+    @classmethod
+    def fromTable(cls, table, dtype = float):
+        # table: forward [x, y] as returned by the table builders
+        lutX = np.asarray(table[0], dtype=float)
+        lutY = np.maximum.accumulate(np.asarray(table[1], dtype=float))
+        low, high = lutY[0], lutY[-1]
+
+        grid = np.linspace(0, 1, cls.inverseSize)
+        inverse = np.interp(low + (high - low) * grid * grid, lutY, lutX)
+        # quantized tables often start with a run of equal values, black encodes to its start
+        inverse[0] = lutX[0]
+
+        slopeLow = (lutX[1] - lutX[0]) / (lutY[1] - lutY[0]) if lutY[1] > lutY[0] else 0.0
+        slopeHigh = (lutX[-1] - lutX[-2]) / (lutY[-1] - lutY[-2]) if lutY[-1] > lutY[-2] else 0.0
+
+        return cls(inverse, (low, high, slopeLow, slopeHigh), dtype)
+
+    def apply(self, input, out = None, pos = None, ndx = None, val = None):
+        # same scratch buffers as iccCurve.apply, out may be input itself
+        low, high, slopeLow, slopeHigh = self.limits
+
+        # out of range values are rare (HDR, negative), their correction is computed
+        # up front since out can overwrite input
+        extra = None
+        if np.size(input) and not (np.min(input) >= low and np.max(input) <= high):
+            extra = np.minimum(np.subtract(input, low), 0) * slopeLow
+            extra += np.maximum(np.subtract(input, high), 0) * slopeHigh
+
+        pos = np.subtract(input, low, out=pos, dtype=self.curve.lutY.dtype)
+        pos *= self.lutNorm
+        np.clip(pos, 0, 1, out=pos)
+        np.sqrt(pos, out=pos)
+
+        out = self.curve.apply(pos, out, pos, ndx, val)
+
+        if extra is not None:
+            np.add(out, extra, out=out, casting='same_kind')
+        return out
+
+
+#
+# Per stage timing of construction and decode
+#
+# Disabled unless an iccStats is attached to a transform (iccToTRC.attachStats) or set
+# as the default for every new one (iccToTRC.defaultStats). Each stage adds its wall
+# time, pixel count and optionally its peak traced allocation to the totals, and is
+# passed on to any registered hooks as hook(stage, seconds, pixels, peakBytes).
+#
+# Stages nest, e.g. 'decode' covers 'curvesA', 'clut' and 'curvesM'. Memory tracking
+# uses tracemalloc, which is process wide, so peaks of concurrently running stages
+# (per channel decodes) overlap.
+#
+class iccStats:
+    def __init__(self, trackMemory: bool = False):
+        self.trackMemory = trackMemory
+        self.hooks = []
+        self.stages = {}
+
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def addHook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def removeHook(self, hook):
+        self.hooks.remove(hook)
+
+    def stage(self, name: str, pixels: int = 0):
+        return iccStage(self, name, pixels)
+
+    def record(self, name: str, seconds: float, pixels: int = 0, peakBytes: int = 0):
+        with self.lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                entry = self.stages[name] = {'calls': 0, 'seconds': 0.0, 'pixels': 0, 'peakBytes': 0}
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['pixels'] += pixels
+            entry['peakBytes'] = max(entry['peakBytes'], peakBytes)
+
+        for hook in self.hooks:
+            hook(name, seconds, pixels, peakBytes)
+
+    def summary(self) -> dict:
+        # per stage totals, with throughput where the stage saw pixels
+        with self.lock:
+            summary = {x: dict(y) for x, y in self.stages.items()}
+        for x in summary.values():
+            x['MPs'] = x['pixels'] / 1e6 / x['seconds'] if x['pixels'] and x['seconds'] > 0 else 0.0
+        return summary
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+
+    def merge(self, other):
+        for name, entry in other.summary().items():
+            with self.lock:
+                mine = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'pixels': 0, 'peakBytes': 0})
+                mine['calls'] += entry['calls']
+                mine['seconds'] += entry['seconds']
+                mine['pixels'] += entry['pixels']
+                mine['peakBytes'] = max(mine['peakBytes'], entry['peakBytes'])
+        return self
+
+
+class iccStage:
+    def __init__(self, stats: iccStats, name: str, pixels: int):
+        self.stats = stats
+        self.name = name
+        self.pixels = pixels
+
+    def __enter__(self):
+        if self.stats.trackMemory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            # the enclosing stage keeps the peak reached so far, the traced peak is
+            # then reset so this stage only sees its own
+            stack = self.stats.local.__dict__.setdefault('stack', [])
+            if stack:
+                stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.frame = [tracemalloc.get_traced_memory()[0], 0]
+            stack.append(self.frame)
+
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        seconds = time.perf_counter() - self.start
+        peakBytes = 0
+
+        if self.stats.trackMemory:
+            stack = self.stats.local.stack
+            stack.pop()
+            peak = max(self.frame[1], tracemalloc.get_traced_memory()[1])
+            peakBytes = max(0, peak - self.frame[0])
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+
+        self.stats.record(self.name, seconds, self.pixels, peakBytes)
+        return False
+
+
 class iccToTRC:
-    def __init__(self, profile: bytes):
-        self.prfByte = profile
+    # pixels per block in tiled decode
+    tilePixels = 1 << 20
+    chromaPixels = 1 << 18
+    # uint8 images of at least this many pixels are deduplicated with a dense 24 bit histogram
+    uniqueDenseMin = 1 << 22
+    # numerator weights of x and y, and the X, Y, Z weights of the denominator
+    chromaWeights = {'xy': (1, 1, (1, 1, 1)), 'uv': (4, 9, (1, 15, 3))}
+
+    #
+    # Well-known profiles, recognized by their primaries and transfer function (see
+    # fingerprint) and then decoded with the closed form of the transfer function.
+    # name: (primaries, see iccGamutCoverage.referencePrimaries, transfer function)
+    #
+    knownProfiles = {
+        'sRGB': ('sRGB', 'sRGB'),
+        'Display P3': ('Display P3', 'sRGB'),
+        'Adobe RGB (1998)': ('Adobe RGB (1998)', 'gamma563'),
+        'ITU-R BT.2020': ('ITU-R BT.2020', 'bt709'),
+        'ITU-R BT.2100 PQ': ('ITU-R BT.2020', 'pq'),
+        'ITU-R BT.2100 HLG': ('ITU-R BT.2020', 'hlg'),
+    }
+    knownWhite = (0.3127, 0.3290)
+    # para function arguments of the transfer functions that have one
+    knownTransfers = {
+        'sRGB': (2.4, 1 / 1.055, 0.055 / 1.055, 1 / 12.92, 0.04045),
+        'bt709': (1 / 0.45, 1 / 1.099, 0.099 / 1.099, 1 / 4.5, 0.081),
+        'gamma563': (563 / 256,),
+        'pq': None,
+        'hlg': None,
+    }
+    # SMPTE ST 2084 m1, m2, c1, c2, c3 and ARIB STD-B67 a, b, c
+    pqConstants = (2610 / 16384, 2523 / 4096 * 128, 3424 / 4096, 2413 / 4096 * 32, 2392 / 4096 * 32)
+    hlgConstants = (0.17883277, 0.28466892, 0.55991073)
+    # largest colorant xy difference and decoded difference (relative to the peak) of a match
+    knownTolerance = (0.002, 0.002)
+    # profile digest -> (name, transfer, scale), or None for no match, shared by all
+    # instances, least recently used digests are dropped past knownDigestsMax
+    knownDigests = OrderedDict()
+    knownDigestsMax = 256
+    knownLock = threading.Lock()
+    knownColorantCache = {}
+
+    channelPool = None
+    channelLock = threading.Lock()
+
+    # iccStats every new transform reports to, see attachStats
+    defaultStats = None
+    noStage = nullcontext()
+
+    def __init__(self, profile: bytes, clutMethod: str = 'tetrahedral', paraLUT: bool = False, precision: str = 'float64', lazy: bool = False,
+                 bakeGrid: int = 0, bakeShaper: str = '', known: bool = True):
+        # lazy: only the header, tag directory and descriptive metadata are parsed here,
+        # curves and CLUT are built by materialize, on the first decode or encode
+        # bakeGrid, bakeShaper: mAB profiles only, see bakeA2B0
+        # known: False always builds the generic tables, see fingerprint
+        self.prfStats = self.defaultStats
+        self.prfLazyLock = threading.RLock()
+        self.prfPending = None
+
+        if lazy:
+            with self.stage('constructMetadata'):
+                self.constructMetadata(profile, clutMethod, paraLUT, precision, bakeGrid, bakeShaper, known)
+            self.prfPending = (clutMethod, paraLUT)
+        else:
+            with self.stage('construct'):
+                self.constructMetadata(profile, clutMethod, paraLUT, precision, bakeGrid, bakeShaper, known)
+                self.constructTransform(clutMethod, paraLUT)
+
+    def materialize(self):
+        # build the deferred transform of a lazy instance, a no-op otherwise. Called first
+        # thing by every decode, encode and chromaticity entry point, a lazy instance
+        # only has the metadata attributes until then.
+        if self.prfPending is None:
+            return self
+
+        with self.prfLazyLock:
+            pending = self.prfPending
+            if pending is None or self.__dict__.get('prfBuilding'):
+                return self
+
+            self.prfBuilding = True
+            try:
+                with self.stage('construct'):
+                    self.constructTransform(*pending)
+                self.prfPending = None
+            finally:
+                del self.prfBuilding
+
+        return self
+
+    @property
+    def isMaterialized(self) -> bool:
+        return self.prfPending is None
+
+    def constructMetadata(self, profile: bytes, clutMethod: str, paraLUT: bool, precision: str, bakeGrid: int = 0, bakeShaper: str = '',
+                          known: bool = True):
+        # profile can be any bytes-like object (bytes, bytearray, memoryview, mmap)
+        # everything below works on zero-copy views of it
+        self.prfByte = memoryview(profile).cast('B')
+        self.prfOptions = {'clutMethod': clutMethod, 'paraLUT': paraLUT, 'precision': precision}
+        if bakeGrid:
+            # only stored when set, keeps the cache keys of unbaked transforms unchanged
+            self.prfOptions.update(bakeGrid=bakeGrid, bakeShaper=bakeShaper)
+        if not known:
+            self.prfOptions.update(known=False)
+
+        # output dtype of every decode, float64, float32 or float16
+        if precision not in ('float64', 'float32', 'float16'):
+            raise Exception(f'Precision {precision} is not supported')
+        if bakeGrid and (bakeGrid < 2 or bakeShaper not in ('', 'A', 'M')):
+            raise Exception(f'Baked CLUT grid {bakeGrid} with shaper "{bakeShaper}" is not supported')
+        if bakeShaper and not bakeGrid:
+            raise Exception(f'Baked CLUT shaper "{bakeShaper}" needs a bakeGrid, nothing is baked without one')
+        self.prfPrecision = precision
+        self.validateHeader()
+        with self.stage('parse'):
+            self.tagDir = self.parseTagDirectory()
         self.prfVer = self.extractICCversion()
 
         p_NameFull = self.extractDescription('desc')
@@ -49,51 +548,91 @@ class iccToTRC:
         self.pcsWhite = self.extractXYZPCS()
 
         self.primariesCA = None
+        self.prfRGBtoXYZ = None
 
+        # integer decode tables, keyed by number of input levels
+        self.trcIntLUTs = {}
+        self.scratchBufs = {}
+
+        # profile class, known without building anything
         if self.validate():
             self.prfType = 'std'
-            self.trcType = self.extractICCtag('rTRC')[0:4].decode('utf-8').strip()
-
-            self.curveLen = int.from_bytes(self.extractICCtag('rTRC')[8:12], 'big')
-            self.curveCont = self.extractICCtag('rTRC')[12:]
-
-            self.paraParams = []
-            self.paraMode = 0
+            self.trcType = self.findTagType('rTRC')
 
             self.primaries = np.array([
                 self.extractXYZdata('rXYZ'),
                 self.extractXYZdata('gXYZ'),
                 self.extractXYZdata('bXYZ')
             ])
+        elif self.findTagType('A2B0') == 'mAB':
+            self.prfType = 'mab'
+            self.trcType = 'A2B0 mAB'
+        elif self.findTagType('A2B0') == 'mft2':
+            self.prfType = 'mft2'
+            self.trcType = 'A2B0 mft2'
 
-            trcAddr = np.array([
-                self.findTagPos('rTRC'),
-                self.findTagPos('gTRC'),
-                self.findTagPos('bTRC')
-            ])
-
-            trcEntries = np.array([
-                self.extractICCtag('rTRC'),
-                self.extractICCtag('gTRC'),
-                self.extractICCtag('bTRC')
-            ])
-
-            if np.all(trcAddr == trcAddr[0]) or np.all(trcEntries == trcEntries[0]):
-                self.uniformTRC = True
-            else:
-                self.uniformTRC = False
-
+    def constructTransform(self, clutMethod: str, paraLUT: bool):
+        self.prfKnown = ''
+        if not self.prfOptions.get('known', True):
+            # generic tables asked for, the memo is neither read nor filled
+            self.constructGeneric(clutMethod, paraLUT)
+            self.bakeIfAsked(clutMethod)
+            return
+
+        prfDigest = self.profileDigest(self.prfByte)
+        memo, known = self.knownLookup(prfDigest)
+
+        if known is not None and self.prfType in ('mab', 'mft2'):
+            # matched before, the A2B0 curves and CLUT are not needed at all
+            self.a2b0_Baked = None
+            self.a2b0_BakeShaper = ''
+            self.useKnown(*known)
+            return
+
+        # matrix/TRC profiles are always parsed, it is cheap and keeps every per-channel
+        # value (trcTypes, trcCurves, ...) in place for the channel level methods
+        self.constructGeneric(clutMethod, paraLUT)
+
+        if not memo:
+            known = self.fingerprint()
+            self.knownStore(prfDigest, known)
+        if known is not None:
+            self.useKnown(*known)
+
+        self.bakeIfAsked(clutMethod)
+
+    def bakeIfAsked(self, clutMethod: str):
+        if self.prfType == 'mab' and self.prfOptions.get('bakeGrid') and not self.prfKnown:
+            with self.stage('bake', self.prfOptions['bakeGrid'] ** 3):
+                self.bakeA2B0(self.prfOptions['bakeGrid'], self.prfOptions['bakeShaper'], clutMethod)
+
+    def constructGeneric(self, clutMethod: str, paraLUT: bool):
+        if self.validate():
+            self.prfType = 'std'
             self.trcTags = [
                 'rTRC',
                 'gTRC',
                 'bTRC'
             ]
 
-            self.trcTypes = [
-                self.extractICCtag('rTRC')[0:4].decode('utf-8').strip(),
-                self.extractICCtag('gTRC')[0:4].decode('utf-8').strip(),
-                self.extractICCtag('bTRC')[0:4].decode('utf-8').strip()
-            ]
+            trcEntries = [self.extractICCtag(x) for x in self.trcTags]
+
+            self.trcType = self.findTagType('rTRC')
+
+            self.curveLen = int.from_bytes(trcEntries[0][8:12], 'big')
+            self.curveCont = trcEntries[0][12:]
+
+            self.paraParams = []
+            self.paraMode = 0
+
+            trcAddr = np.array([self.findTagPos(x) for x in self.trcTags])
+
+            if np.all(trcAddr == trcAddr[0]) or all(x == trcEntries[0] for x in trcEntries):
+                self.uniformTRC = True
+            else:
+                self.uniformTRC = False
+
+            self.trcTypes = [self.findTagType(x) for x in self.trcTags]
             self.trcParaParams = [None] * 3
             self.trcCurvLens = [None] * 3
             self.trcCurvGammas = [None] * 3
@@ -103,34 +642,38 @@ class iccToTRC:
                 if self.trcTypes[x] == 'para':
                     self.trcParaParams[x] = self.parametricParse(self.trcTags[x])
                     #
-                    # experimental note 1: Speeds up conversion while sacrificing a bit of accuracy
-                    # by converting the parametric function into curve LUT
+                    # experimental note 1: Converts the parametric function into curve LUT,
+                    # optional since the function itself is evaluated directly and exactly
                     # |
                     # v
-                    self.trcCurvLUTs[x] = self.trcParaToCurv(self.trcParaParams[x])
+                    if paraLUT:
+                        self.trcCurvLUTs[x] = self.trcParaToCurv(self.trcParaParams[x])
                 elif self.trcTypes[x] == 'curv':
-                    self.trcCurvLens[x] = int.from_bytes(self.extractICCtag(self.trcTags[x])[8:12], 'big')
+                    self.trcCurvLens[x] = int.from_bytes(trcEntries[x][8:12], 'big')
                     if self.trcCurvLens[x] == 1:
-                        self.trcCurvGammas[x] = self.u8Fixed8NumberToFloat(self.extractICCtag(self.trcTags[x])[12:])
+                        self.trcCurvGammas[x] = self.u8Fixed8NumberToFloat(trcEntries[x][12:14])
                     else:
-                        self.trcCurvLUTs[x] = self.curvModeGetTable(self.trcTags[x])
+                        self.trcCurvLUTs[x] = self.curvModeGetTableSA(trcEntries[x])
+
+            self.trcCurves = [iccCurve(x, self.computeDtype) if x is not None else None for x in self.trcCurvLUTs]
+            self.trcInverse = self.inverseCurves()
 
             if self.trcType == 'para':
-                self.paraMode = int.from_bytes(self.extractICCtag('rTRC')[8:10], 'big')
+                self.paraMode = int.from_bytes(trcEntries[0][8:10], 'big')
                 self.paraParams = self.parametricParse('rTRC')
 
             if self.trcType == 'curv' and self.curveLen == 1:
-                gamma = self.u8Fixed8NumberToFloat(self.curveCont)
+                gamma = self.u8Fixed8NumberToFloat(self.curveCont[0:2])
                 self.gamma = gamma
             else:
                 gamma = 1.0
                 self.gamma = gamma
 
-            # vectorized function, unused if used with experimental note 1
-            self.vTRCParaToLinearSingle = vectorize(self.trcParaToLinearSingle)
+            # kept for compatibility, trcParaToLinearSingle is vectorized itself
+            self.vTRCParaToLinearSingle = self.trcParaToLinearSingle
 
 
-        elif self.findTagPos('A2B0') != -1 and (self.extractICCtag('A2B0')[0:4].decode('utf-8').strip() == 'mAB'):
+        elif self.findTagType('A2B0') == 'mAB':
 
             ##
             ## Workaround for HDR PQ Profile from PNG
@@ -148,7 +691,7 @@ class iccToTRC:
             a2b0_buf = self.extractICCtag('A2B0')
 
             # should be multi-function A-to-B table type signature 'mAB'
-            if a2b0_buf[0:4].decode('utf-8').strip() != 'mAB':
+            if self.tagTypeSA(a2b0_buf) != 'mAB':
                 raise Exception('A2B0 is used, but its not a multifunction "mAB" tag')
             
             a2b0_inCh = int(a2b0_buf[8])
@@ -169,7 +712,6 @@ class iccToTRC:
 
             ## to be fixed, find a way to look for an absolute length rather than address to next tag
             ## so that if any of the tags are empty or overlapped, the code didn't break
-            # a2b0_B = a2b0_buf[a2b0_Bpos:a2b0_matpos] if a2b0_tagsExist[0] else 0 # B curve never used here
             # a2b0_mat = a2b0_buf[a2b0_matpos:a2b0_Mpos] if a2b0_tagsExist[1] else 0
             # a2b0_M = a2b0_buf[a2b0_Mpos:a2b0_LUTpos] if a2b0_tagsExist[2] else 0
             # a2b0_LUT = a2b0_buf[a2b0_LUTpos:a2b0_Apos] if a2b0_tagsExist[3] else 0
@@ -177,7 +719,6 @@ class iccToTRC:
 
             ## or just remove the end position altogether ...
             ## as each parse functions will individually check the length of their own tags
-            a2b0_B = a2b0_buf[a2b0_Bpos:] if a2b0_tagsExist[0] else 0 # B curve never used here
             a2b0_mat = a2b0_buf[a2b0_matpos:] if a2b0_tagsExist[1] else 0
             a2b0_M = a2b0_buf[a2b0_Mpos:] if a2b0_tagsExist[2] else 0
             a2b0_LUT = a2b0_buf[a2b0_LUTpos:] if a2b0_tagsExist[3] else 0
@@ -187,10 +728,7 @@ class iccToTRC:
             # Primaries from Matrix
             #
             if a2b0_tagsExist[1]:
-                a2b0_Matrix = []
-                for x in range(12):
-                    ndx = x*4
-                    a2b0_Matrix.append(self.s15Fixed16NumberToFloat(a2b0_mat[ndx:ndx+4]))
+                a2b0_Matrix = self.s15Fixed16ArrayToFloat(a2b0_mat[0:48])
 
                 self.primaries = np.array([
                     [a2b0_Matrix[0], a2b0_Matrix[3], a2b0_Matrix[6]],
@@ -224,61 +762,20 @@ class iccToTRC:
                     int(a2b0_LUT[2])
                 ]
 
-                a2b0_LUTlen = a2b0_LUTdim[0] * a2b0_LUTdim[1] * a2b0_LUTdim[2]
                 a2b0_LUTdataType = int(a2b0_LUT[16])
                 a2b0_LUTentries = a2b0_LUT[20:]
 
-                a2b0_LUTbuf = []
-                for x in range(a2b0_LUTlen):
-                    if a2b0_LUTdataType == 1:
-                        a2b0_LUTbuf.append(
-                            [
-                                int(a2b0_LUTentries[x*3])/255,
-                                int(a2b0_LUTentries[(x*3)+1])/255,
-                                int(a2b0_LUTentries[(x*3)+2])/255
-                            ])
-                    if a2b0_LUTdataType == 2:
-                        a2b0_LUTbuf.append(
-                            [
-                                int.from_bytes(a2b0_LUTentries[(x*6):(x*6)+2], 'big')/65535,
-                                int.from_bytes(a2b0_LUTentries[(x*6)+2:(x*6)+4], 'big')/65535,
-                                int.from_bytes(a2b0_LUTentries[(x*6)+4:(x*6)+6], 'big')/65535,
-                            ])
-
-                a2b0_LUTarr = np.reshape(a2b0_LUTbuf, (a2b0_LUTdim[0],a2b0_LUTdim[1],a2b0_LUTdim[2],3))
-                self.a2b0_LUTapp = colour.LUT3D(a2b0_LUTarr)
+                with self.stage('clutBuild'):
+                    self.a2b0_LUTapp = iccCLUT.fromBuffer(a2b0_LUTentries, a2b0_LUTdim, a2b0_LUTdataType, clutMethod, self.computeDtype)
             else:
                 # identity function
-                lin_lut = np.array([[0, 0, 0], [0, 0, 1], [0, 1, 0], [0, 1, 1], [1, 0, 0], [1, 0, 1], [1, 1, 0], [1, 1, 1]], dtype=float)
-                lin_lutrs = np.reshape(lin_lut, (2,2,2,3))
-                self.a2b0_LUTapp = colour.LUT3D(lin_lutrs)
+                self.a2b0_LUTapp = iccCLUT.identity(clutMethod, self.computeDtype)
 
             #
             # M Curve
             #
             if a2b0_tagsExist[2]:
-                if a2b0_M.find(b'para') != -1:
-                    a2b0_Mcurv_ndx = []
-                    a2b0_Mcurv_ndx.append(a2b0_M[0:].find(b'para'))
-                    a2b0_Mcurv_ndx.append(a2b0_M.find(b'para', (a2b0_Mcurv_ndx[0] + 4)))
-                    a2b0_Mcurv_ndx.append(a2b0_M.find(b'para', (a2b0_Mcurv_ndx[1] + 4)))
-
-                    self.a2b0_Mtrc = [
-                        self.trcParaToCurv(self.parametricParseSA(a2b0_M[a2b0_Mcurv_ndx[0]:a2b0_Mcurv_ndx[1]])),
-                        self.trcParaToCurv(self.parametricParseSA(a2b0_M[a2b0_Mcurv_ndx[1]:a2b0_Mcurv_ndx[2]])),
-                        self.trcParaToCurv(self.parametricParseSA(a2b0_M[a2b0_Mcurv_ndx[2]:]))
-                    ]
-                elif a2b0_M.find(b'curv') != -1:
-                    a2b0_Mcurv_ndx = []
-                    a2b0_Mcurv_ndx.append(a2b0_M[0:].find(b'curv'))
-                    a2b0_Mcurv_ndx.append(a2b0_M.find(b'curv', (a2b0_Mcurv_ndx[0] + 4)))
-                    a2b0_Mcurv_ndx.append(a2b0_M.find(b'curv', (a2b0_Mcurv_ndx[1] + 4)))
-
-                    self.a2b0_Mtrc = [
-                        self.curvModeGetTableSA(a2b0_M[a2b0_Mcurv_ndx[0]:a2b0_Mcurv_ndx[1]]),
-                        self.curvModeGetTableSA(a2b0_M[a2b0_Mcurv_ndx[1]:a2b0_Mcurv_ndx[2]]),
-                        self.curvModeGetTableSA(a2b0_M[a2b0_Mcurv_ndx[2]:])
-                    ]
+                self.a2b0_Mtrc = self.curveSetParseSA(a2b0_M)
             else:
                 # identity function
                 self.a2b0_Mtrc = [
@@ -291,28 +788,7 @@ class iccToTRC:
             # A Curve
             #
             if a2b0_tagsExist[4]:
-                if a2b0_A.find(b'curv') != -1:
-                    a2b0_Acurv_ndx = []
-                    a2b0_Acurv_ndx.append(a2b0_A[0:].find(b'curv'))
-                    a2b0_Acurv_ndx.append(a2b0_A.find(b'curv', (a2b0_Acurv_ndx[0] + 4)))
-                    a2b0_Acurv_ndx.append(a2b0_A.find(b'curv', (a2b0_Acurv_ndx[1] + 4)))
-
-                    self.a2b0_Atrc = [
-                        self.curvModeGetTableSA(a2b0_A[a2b0_Acurv_ndx[0]:a2b0_Acurv_ndx[1]]),
-                        self.curvModeGetTableSA(a2b0_A[a2b0_Acurv_ndx[1]:a2b0_Acurv_ndx[2]]),
-                        self.curvModeGetTableSA(a2b0_A[a2b0_Acurv_ndx[2]:])
-                    ]
-                elif a2b0_M.find(b'para') != -1:
-                    a2b0_Acurv_ndx = []
-                    a2b0_Acurv_ndx.append(a2b0_A[0:].find(b'para'))
-                    a2b0_Acurv_ndx.append(a2b0_A.find(b'para', (a2b0_Acurv_ndx[0] + 4)))
-                    a2b0_Acurv_ndx.append(a2b0_A.find(b'para', (a2b0_Acurv_ndx[1] + 4)))
-
-                    self.a2b0_Atrc = [
-                        self.trcParaToCurv(self.parametricParseSA(a2b0_A[a2b0_Acurv_ndx[0]:a2b0_Acurv_ndx[1]])),
-                        self.trcParaToCurv(self.parametricParseSA(a2b0_A[a2b0_Acurv_ndx[1]:a2b0_Acurv_ndx[2]])),
-                        self.trcParaToCurv(self.parametricParseSA(a2b0_A[a2b0_Acurv_ndx[2]:]))
-                    ]
+                self.a2b0_Atrc = self.curveSetParseSA(a2b0_A)
             else:
                 # identity function
                 self.a2b0_Atrc = [
@@ -321,48 +797,20 @@ class iccToTRC:
                     np.array([[0, 1], [0, 1]], dtype='float')
                 ]
 
-            #
-            # Unused, but this also still can be accessed from outside the module if needed
-            #
-            # B Curve
-            #
-            if a2b0_tagsExist[0]:
-                if a2b0_B.find(b'curv') != -1:
-                    a2b0_Bcurv_ndx = []
-                    a2b0_Bcurv_ndx.append(a2b0_B[0:].find(b'curv'))
-                    a2b0_Bcurv_ndx.append(a2b0_B.find(b'curv', (a2b0_Bcurv_ndx[0] + 4)))
-                    a2b0_Bcurv_ndx.append(a2b0_B.find(b'curv', (a2b0_Bcurv_ndx[1] + 4)))
-
-                    self.a2b0_Btrc = [
-                        self.curvModeGetTableSA(a2b0_B[a2b0_Bcurv_ndx[0]:a2b0_Bcurv_ndx[1]]),
-                        self.curvModeGetTableSA(a2b0_B[a2b0_Bcurv_ndx[1]:a2b0_Bcurv_ndx[2]]),
-                        self.curvModeGetTableSA(a2b0_B[a2b0_Bcurv_ndx[2]:])
-                    ]
-                elif a2b0_M.find(b'para') != -1:
-                    a2b0_Bcurv_ndx = []
-                    a2b0_Bcurv_ndx.append(a2b0_B[0:].find(b'para'))
-                    a2b0_Bcurv_ndx.append(a2b0_B.find(b'para', (a2b0_Bcurv_ndx[0] + 4)))
-                    a2b0_Bcurv_ndx.append(a2b0_B.find(b'para', (a2b0_Bcurv_ndx[1] + 4)))
-
-                    self.a2b0_Btrc = [
-                        self.trcParaToCurv(self.parametricParseSA(a2b0_B[a2b0_Bcurv_ndx[0]:a2b0_Bcurv_ndx[1]])),
-                        self.trcParaToCurv(self.parametricParseSA(a2b0_B[a2b0_Bcurv_ndx[1]:a2b0_Bcurv_ndx[2]])),
-                        self.trcParaToCurv(self.parametricParseSA(a2b0_B[a2b0_Bcurv_ndx[2]:]))
-                    ]
-            else:
-                # identity function
-                self.a2b0_Btrc = [
-                    np.array([[0, 1], [0, 1]], dtype='float'),
-                    np.array([[0, 1], [0, 1]], dtype='float'),
-                    np.array([[0, 1], [0, 1]], dtype='float')
-                ]
+            # B curves are unused here, a2b0_Btrc parses them on access
+
+            self.a2b0_Acurves = [iccCurve(x, self.computeDtype) for x in self.a2b0_Atrc]
+            self.a2b0_Mcurves = [iccCurve(x, self.computeDtype) for x in self.a2b0_Mtrc]
 
-            if np.all(self.a2b0_Mtrc == self.a2b0_Mtrc[0]) and np.all(self.a2b0_Atrc == self.a2b0_Atrc[0]):
+            if self.tablesUniformSA(self.a2b0_Mtrc) and self.tablesUniformSA(self.a2b0_Atrc):
                 self.uniformTRC = True
             else:
                 self.uniformTRC = False
 
-        elif self.findTagPos('A2B0') != -1 and (self.extractICCtag('A2B0')[0:4].decode('utf-8').strip() == 'mft2'):
+            self.a2b0_Baked = None
+            self.a2b0_BakeShaper = ''
+
+        elif self.findTagType('A2B0') == 'mft2':
             self.trcType = 'A2B0 mft2'
             self.uniformTRC = False
             self.prfType = 'mft2'
@@ -378,11 +826,7 @@ class iccToTRC:
             if a2b0_inCh != 3 or a2b0_outCh != 3:
                 raise Exception(f'Colour Channel mismatch, should be 3 but detected in:{a2b0_inCh} out:{a2b0_outCh}')
 
-            a2b0_mat = np.array([
-                [self.s15Fixed16NumberToFloat(a2b0_buf[12:16]), self.s15Fixed16NumberToFloat(a2b0_buf[16:20]), self.s15Fixed16NumberToFloat(a2b0_buf[20:24])],
-                [self.s15Fixed16NumberToFloat(a2b0_buf[24:28]), self.s15Fixed16NumberToFloat(a2b0_buf[28:32]), self.s15Fixed16NumberToFloat(a2b0_buf[32:36])],
-                [self.s15Fixed16NumberToFloat(a2b0_buf[36:40]), self.s15Fixed16NumberToFloat(a2b0_buf[40:44]), self.s15Fixed16NumberToFloat(a2b0_buf[44:48])]
-            ])
+            a2b0_mat = self.s15Fixed16ArrayToFloat(a2b0_buf[12:48]).reshape(3, 3)
 
             a2b0_inTabLen = int.from_bytes(a2b0_buf[48:50], 'big')
             a2b0_outTabLen = int.from_bytes(a2b0_buf[50:52], 'big')
@@ -403,30 +847,21 @@ class iccToTRC:
                 self.a2b0MFT2GetTableSA(a2b0_buf[a2b0_outTabPos+(a2b0_outTabLen * 4):a2b0_outTabPos+(a2b0_outTabLen * 6)]),
             ]
 
-            a2b0_LUTlen = a2b0_clutpoints ** 3
             a2b0_LUTentries = a2b0_buf[a2b0_clutPos:a2b0_outTabPos]
-
-            a2b0_LUTbuf = []
-            for x in range(a2b0_LUTlen):
-                a2b0_LUTbuf.append(
-                    [
-                        int.from_bytes(a2b0_LUTentries[(x*6):(x*6)+2], 'big')/65535,
-                        int.from_bytes(a2b0_LUTentries[(x*6)+2:(x*6)+4], 'big')/65535,
-                        int.from_bytes(a2b0_LUTentries[(x*6)+4:(x*6)+6], 'big')/65535,
-                    ])
-
-            a2b0_LUTarr = np.reshape(a2b0_LUTbuf, (a2b0_clutpoints,a2b0_clutpoints,a2b0_clutpoints,3))
-            a2b0_LUTapp = colour.LUT3D(a2b0_LUTarr)
+            a2b0_LUTapp = iccCLUT.fromBuffer(a2b0_LUTentries, [a2b0_clutpoints] * 3, 2, clutMethod)
 
             self.trcCurvLUTs = a2b0_inTable
+            self.trcCurves = [iccCurve(x, self.computeDtype) for x in a2b0_inTable]
             self.trcTypes = ['curv', 'curv', 'curv']
             self.trcCurvLens = [a2b0_inTabLen, a2b0_inTabLen, a2b0_inTabLen]
 
-            if np.all(self.trcCurvLUTs == self.trcCurvLUTs[0]):
+            if self.tablesUniformSA(self.trcCurvLUTs):
                 self.uniformTRC = True
             else:
                 self.uniformTRC = False
 
+            self.trcInverse = self.inverseCurves()
+
             self.primaries = np.array([
                 a2b0_LUTapp.apply([1,0,0]),
                 a2b0_LUTapp.apply([0,1,0]),
@@ -437,232 +872,1254 @@ class iccToTRC:
             raise Exception('Profile not supported')
 
 
-    def trcDecode(self, input):
+    def inverseCurves(self) -> list:
+        # encode tables of the curv table channels, para and gamma curves are inverted
+        # analytically, uniform curves only ever use the first channel
+        self.materialize()
+        with self.stage('inverseBuild'):
+            inverse = [
+                iccInverseCurve.fromTable(self.trcCurvLUTs[x], self.computeDtype)
+                if self.trcTypes[x] == 'curv' and self.trcCurvLens[x] != 1 else None
+                for x in range(1 if self.uniformTRC else 3)
+            ]
+        return inverse * 3 if self.uniformTRC else inverse
+
+    #
+    # Well-known profile fast path
+    #
+    # A profile matches when its colorants and media white are within tolerance of a
+    # known space, an mAB CLUT is an identity (the fast path skips it, mft2 CLUTs are
+    # already taken as linear by the generic path) and a probe decode of a gray and
+    # three single channel ramps agrees with the closed form transfer function of that
+    # space, scaled to the decoded peak (HDR profiles put 1.0 at different luminances). The result, match or not, is kept per profile
+    # digest whatever the construction options, later instances of the same profile
+    # skip the probe, and for matching A2B0 profiles the whole curve and CLUT construction.
+    #
+    @classmethod
+    def knownLookup(cls, digest: str) -> tuple:
+        # (memoized, match), a memoized None is a profile known not to match
+        with cls.knownLock:
+            if digest not in cls.knownDigests:
+                return False, None
+            cls.knownDigests.move_to_end(digest)
+            return True, cls.knownDigests[digest]
+
+    @classmethod
+    def knownStore(cls, digest: str, known):
+        with cls.knownLock:
+            cls.knownDigests[digest] = known
+            cls.knownDigests.move_to_end(digest)
+            while len(cls.knownDigests) > cls.knownDigestsMax:
+                cls.knownDigests.popitem(last=False)
+
+    @classmethod
+    def clearKnown(cls):
+        with cls.knownLock:
+            cls.knownDigests.clear()
+
+    @classmethod
+    def knownColorants(cls, primaries: str) -> np.ndarray:
+        # rows: D50 PCS XYZ of the red, green and blue colorants, Bradford adapted from D65
+        if primaries not in cls.knownColorantCache:
+            def xyToXYZ(xy):
+                return np.array([xy[0] / xy[1], 1, (1 - xy[0] - xy[1]) / xy[1]])
+
+            rgbXYZ = np.array([xyToXYZ(x) for x in iccGamutCoverage.referencePrimaries[primaries]]).T
+            whiteXYZ = xyToXYZ(cls.knownWhite)
+            npm = rgbXYZ * np.linalg.solve(rgbXYZ, whiteXYZ)
+
+            cls.knownColorantCache[primaries] = (cls.bradfordToD50(whiteXYZ) @ npm).T
+        return cls.knownColorantCache[primaries]
+
+    @staticmethod
+    def bradfordToD50(whiteXYZ) -> np.ndarray:
+        # Bradford adaptation matrix from whiteXYZ to the D50 PCS white, as stored in chad tags
+        return iccToTRC.bradford(whiteXYZ, (0.9642, 1.0, 0.8249))
+
+    @staticmethod
+    def bradford(srcXYZ, dstXYZ) -> np.ndarray:
+        # von Kries adaptation matrix from srcXYZ to dstXYZ in the Bradford cone space
+        bradford = np.array([[0.8951, 0.2664, -0.1614], [-0.7502, 1.7135, 0.0367], [0.0389, -0.0685, 1.0296]])
+        gain = (bradford @ np.asarray(dstXYZ, dtype=float)) / (bradford @ np.asarray(srcXYZ, dtype=float))
+        return inv(bradford) @ np.diag(gain) @ bradford
+
+    def knownCandidates(self, primaries) -> list:
+        # (name, transfer) of the well-known profiles the colorant XYZ rows and the media
+        # white are within tolerance of, the transfer function is not looked at
+        colorants = np.asarray(primaries, dtype=float)
+        colorantSum = np.sum(colorants, axis=1, keepdims=True)
+        if colorants.shape != (3, 3) or np.any(colorantSum == 0):
+            return []
+        xy = colorants[:, :2] / colorantSum
+
+        white = self.mediaWhite()
+        if white is None or np.sum(white) <= 0:
+            return []
+        if np.max(np.abs(white[:2] / np.sum(white) - self.knownWhite)) > self.knownTolerance[0]:
+            return []
+
+        candidates = []
+        for name, (primaries, transfer) in self.knownProfiles.items():
+            known = self.knownColorants(primaries)
+            if np.max(np.abs(xy - known[:, :2] / np.sum(known, axis=1, keepdims=True))) <= self.knownTolerance[0]:
+                candidates.append((name, transfer))
+        return candidates
+
+    def knownMatch(self, candidates, probe, decoded):
+        # first candidate whose transfer function, scaled to the decoded peak, agrees
+        # with the decoded probe, (name, transfer, scale) or None
+        scale = float(np.mean(decoded[0, -1]))
+        if not np.isfinite(scale) or scale <= 0:
+            return None
+
+        for name, transfer in candidates:
+            expected = self.trcTransferToLinear(probe, transfer) * scale
+            if np.max(np.abs(decoded - expected)) <= self.knownTolerance[1] * scale:
+                return name, transfer, scale
+        return None
+
+    def fingerprint(self):
+        # (name, transfer, scale) of the well-known profile this one matches, else None
+        candidates = self.knownCandidates(self.primaries)
+        if not candidates:
+            return None
+
+        if self.prfType == 'mab':
+            # channels mixed by the CLUT would be lost on the per-channel fast path
+            table = self.a2b0_LUTapp.table
+            nodes = np.stack(np.meshgrid(*[np.linspace(0, 1, x) for x in table.shape[:3]], indexing='ij'), axis=-1)
+            if np.max(np.abs(table - nodes)) > self.knownTolerance[1]:
+                return None
+
+        ramp = np.linspace(0, 1, 256)
+        probe = np.zeros((4, 256, 3))
+        probe[0] = ramp[:, None]
+        for x in range(3):
+            probe[x + 1, :, x] = ramp
+        with self.stage('fingerprint', probe.size // 3):
+            decoded = self.trcDecodeDispatch(probe, np.empty(probe.shape))
+
+        return self.knownMatch(candidates, probe, decoded)
+
+    def fingerprintTags(self) -> str:
+        # name of the well-known profile a matrix/TRC profile matches, '' if none, like
+        # fingerprint but with each channel ramp decoded straight from its TRC tag, so
+        # nothing is built. A2B0 profiles cannot be matched without their CLUT, always ''.
+        if self.prfType != 'std':
+            return ''
+        candidates = self.knownCandidates(self.primaries)
+        if not candidates:
+            return ''
+
+        # a gray ramp, the channels are independent curves here
+        ramp = np.linspace(0, 1, 256)
+        probe = np.repeat(ramp[None, :, None], 3, axis=-1)
+        decoded = np.stack([self.tagCurveToLinear(x, ramp) for x in ('rTRC', 'gTRC', 'bTRC')], axis=-1)[None]
+
+        match = self.knownMatch(candidates, probe, decoded)
+        return match[0] if match is not None else ''
+
+    def useKnown(self, name: str, transfer: str, scale: float):
+        self.prfKnown = name
+        self.knownTransfer = transfer
+        self.knownScale = scale
+        self.uniformTRC = True
+
+        if self.prfType != 'std':
+            # A2B0 primaries otherwise come out of the matrix or CLUT, matrix/TRC
+            # profiles keep their colorant tags, parsed with the metadata
+            self.primaries = self.knownColorants(self.knownProfiles[name][0])
+
+    #
+    # Baked A2B0, the A curves -> CLUT -> M curves chain sampled once into a single
+    # gridPoints^3 CLUT (e.g. 33 or 65), so decode is one interpolation pass instead of
+    # three. Input outside 0.0 - 1.0 is clipped by the grid instead of extrapolated.
+    #
+    # shaper keeps one curve set exact as a 1D stage: 'A' in front of the grid (the grid
+    # then covers CLUT and M curves), 'M' behind it (A curves and CLUT). Worth it for
+    # steep HDR curves (PQ, HLG), which a linear interpolation between grid points
+    # would otherwise flatten near black.
+    #
+    def bakeA2B0(self, gridPoints: int, shaper: str = '', clutMethod: str = 'tetrahedral'):
+        self.materialize()
+        grid = np.linspace(0, 1, gridPoints)
+        nodes = np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), axis=-1).astype(self.computeDtype)
+
+        if shaper != 'A':
+            for x in range(3):
+                self.paraCurveToLinearNP_SingleSA(nodes[..., x], self.a2b0_Acurves, x, nodes[..., x])
+        self.a2b0_LUTapp.apply(nodes, out=nodes)
+        if shaper != 'M':
+            for x in range(3):
+                self.paraCurveToLinearNP_SingleSA(nodes[..., x], self.a2b0_Mcurves, x, nodes[..., x])
+
+        self.a2b0_Baked = iccCLUT(nodes, clutMethod, self.computeDtype)
+        self.a2b0_BakeShaper = shaper
+        return self.a2b0_Baked
+
+    @property
+    def a2b0_Btrc(self):
+        # Unused, but this also still can be accessed from outside the module if needed
+        if self.prfType != 'mab':
+            raise AttributeError('a2b0_Btrc')
+
+        a2b0_buf = self.extractICCtag('A2B0')
+        a2b0_Bpos = int.from_bytes(a2b0_buf[12:16], 'big')
+
+        if a2b0_Bpos:
+            return self.curveSetParseSA(a2b0_buf[a2b0_Bpos:])
+
+        # identity function
+        return [
+            np.array([[0, 1], [0, 1]], dtype='float'),
+            np.array([[0, 1], [0, 1]], dtype='float'),
+            np.array([[0, 1], [0, 1]], dtype='float')
+        ]
+
+    @classmethod
+    def fromFile(cls, path: str, **kwargs):
+        # map the profile file instead of reading it, tag data is then decoded
+        # straight from the mapped pages
+        with open(path, 'rb') as f:
+            prfMap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(prfMap, **kwargs)
+
+    @classmethod
+    def fromReference(cls, name: str = 'sRGB', precision: str = 'float64'):
+        # transform of a well-known profile built from its reference primaries, white and
+        # transfer function alone, for images without an embedded profile. There are no
+        # profile bytes behind it, so nothing that reads tags (validate, saveCompiled,
+        # the decode pool) applies to it.
+        if name not in cls.knownProfiles:
+            raise Exception(f'Unknown reference profile {name}')
+        if precision not in ('float64', 'float32', 'float16'):
+            raise Exception(f'Precision {precision} is not supported')
+        primaries, transfer = cls.knownProfiles[name]
+
+        prf = cls.__new__(cls)
+        prf.prfStats = cls.defaultStats
+        prf.prfLazyLock = threading.RLock()
+        prf.prfPending = None
+
+        prf.prfByte = None
+        prf.prfOptions = {'reference': name, 'precision': precision}
+        prf.prfPrecision = precision
+        prf.prfName = name
+        prf.prfVer = None
+        prf.prfType = 'std'
+        prf.trcType = transfer
+
+        prf.primaries = cls.knownColorants(primaries)
+        prf.primariesCA = np.ravel(iccGamutCoverage.referencePrimaries[primaries]).astype(float)
+        prf.prfWhite = np.array(cls.knownWhite)
+        prf.prfRGBtoXYZ = None
+
+        prf.trcIntLUTs = {}
+        prf.scratchBufs = {}
+        prf.useKnown(name, transfer, 1.0)
+
+        return prf
+
+    @property
+    def prfDtype(self):
+        return np.dtype(self.prfPrecision)
+
+    @property
+    def computeDtype(self):
+        # float16 output is still computed in float32, numpy has no native float16 math
+        return np.dtype(np.float64) if self.prfPrecision == 'float64' else np.dtype(np.float32)
+
+    def stage(self, name: str, pixels: int = 0):
+        # context timing one stage into the attached iccStats, a no-op without one
+        if self.prfStats is None:
+            return self.noStage
+        return self.prfStats.stage(name, pixels)
+
+    def attachStats(self, stats = None):
+        # stats: an iccStats, a new one is created if omitted, None detaches
+        self.prfStats = stats if stats is not None else iccStats()
+        return self.prfStats
+
+    def detachStats(self):
+        self.prfStats = None
+
+    @classmethod
+    def cached(cls, profile: bytes, **kwargs):
+        # shared, already constructed transform from the module registry
+        return prfRegistry.get(profile, **kwargs)
+
+    @staticmethod
+    def profileDigest(profile: bytes) -> str:
+        return hashlib.sha256(memoryview(profile)).hexdigest()
+
+    #
+    # Compiled artifact
+    #
+    # Raw file: magic, format version, JSON header length, JSON header, then every
+    # array 64 byte aligned. The header describes the instance state and where each
+    # array is, arrays are loaded back as read-only views of one np.memmap so
+    # processes loading the same artifact share its pages.
+    #
+    compiledMagic = b'ICCTRC\x00\x00'
+    compiledVersion = 4
+    compiledAlign = 64
+
+    @staticmethod
+    def compiledPath(cacheDir: str, profile: bytes, **kwargs) -> str:
+        optDigest = hashlib.sha256(repr(sorted(kwargs.items())).encode('utf-8')).hexdigest()
+        return os.path.join(cacheDir, f'{iccToTRC.profileDigest(profile)}-{optDigest[:8]}.icctrc')
+
+    @classmethod
+    def fromCompiledCache(cls, profile: bytes, cacheDir: str, **kwargs):
+        # load the artifact for this profile if there is a valid one, else build and write it
+        path = cls.compiledPath(cacheDir, profile, **kwargs)
+
+        if os.path.exists(path):
+            try:
+                return cls.fromCompiled(path, profile)
+            except Exception:
+                pass
+
+        prf = cls(profile, **kwargs)
+        os.makedirs(cacheDir, exist_ok=True)
+        prf.saveCompiled(path)
+
+        return prf
+
+    def saveCompiled(self, path: str):
+        # the artifact holds the built transform, and the profile derived colourspace values
+        self.materialize()
+        if self.primariesCA is None:
+            adapted = self.adaptedChromaticities(self.primaries)
+            if adapted is not None:
+                self.primariesCA, self.prfWhite = adapted
+
+        arrays = []
+
+        def encode(obj):
+            if obj is None or isinstance(obj, (bool, int, float, str)):
+                return obj
+            if isinstance(obj, (np.bool_, np.integer, np.floating)):
+                return obj.item()
+            if isinstance(obj, np.ndarray):
+                arrays.append(np.ascontiguousarray(obj))
+                return {'__array__': len(arrays) - 1}
+            if isinstance(obj, memoryview):
+                return {'__bytes__': encode(np.frombuffer(obj, dtype='u1'))}
+            if isinstance(obj, (list, tuple)):
+                return {'__list__': [encode(x) for x in obj], 'tuple': isinstance(obj, tuple)}
+            if isinstance(obj, dict):
+                return {'__dict__': [[encode(k), encode(v)] for k, v in obj.items()]}
+            if isinstance(obj, iccCurve):
+                return {'__curve__': encode(obj.lutY)}
+            if isinstance(obj, iccInverseCurve):
+                return {'__inverse__': encode(obj.curve.lutY), 'limits': list(obj.limits)}
+            if isinstance(obj, iccCLUT):
+                return {'__clut__': encode(obj.table), 'method': obj.method}
+            raise Exception(f'Cannot store {type(obj).__name__} in a compiled profile')
+
+        state = {}
+        for key, value in self.__dict__.items():
+            if key in ('prfByte', 'vTRCParaToLinearSingle', 'scratchBufs', 'prfStats', 'prfLazyLock', 'prfPending'):
+                continue
+            state[key] = encode(value)
+
+        arrays.append(np.frombuffer(self.prfByte, dtype='u1'))
+
+        header = {
+            'prfHash': self.profileDigest(self.prfByte),
+            'prfByte': len(arrays) - 1,
+            'state': state,
+            'arrays': []
+        }
+
+        # header length depends on the offsets, so place the arrays from a generous
+        # estimate of the header size and pad the header up to it
+        dataPos = 16 + len(json.dumps(header)) + (len(arrays) * 96) + 1024
+        dataPos += -dataPos % self.compiledAlign
+        for arr in arrays:
+            header['arrays'].append({'offset': dataPos, 'dtype': arr.dtype.str, 'shape': list(arr.shape)})
+            dataPos += arr.nbytes + (-arr.nbytes % self.compiledAlign)
+
+        headerByte = json.dumps(header).encode('utf-8')
+        dataStart = header['arrays'][0]['offset']
+
+        # write to a temporary file and move it in place, readers never see a partial file
+        fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.compiledMagic)
+                f.write(struct.pack('<LL', self.compiledVersion, len(headerByte)))
+                f.write(headerByte)
+                f.write(b'\x00' * (dataStart - 16 - len(headerByte)))
+                for arr, arrInfo in zip(arrays, header['arrays']):
+                    f.seek(arrInfo['offset'])
+                    f.write(arr.tobytes())
+            # mkstemp creates the file owner-only, artifacts are meant to be shared
+            os.chmod(tmpPath, 0o644)
+            os.replace(tmpPath, path)
+        except:
+            os.remove(tmpPath)
+            raise
+
+    @classmethod
+    def compiledValid(cls, path: str) -> bool:
+        # True for an existing artifact in the current format, only its first bytes are read
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(16)
+        except OSError:
+            return False
+        return len(head) == 16 and head[:8] == cls.compiledMagic and struct.unpack('<L', head[8:12])[0] == cls.compiledVersion
+
+    @classmethod
+    def fromCompiled(cls, path: str, profile: bytes = None):
+        with open(path, 'rb') as f:
+            magic = f.read(8)
+            if magic != cls.compiledMagic:
+                raise Exception(f'{path} is not a compiled profile')
+
+            version, headerLen = struct.unpack('<LL', f.read(8))
+            if version != cls.compiledVersion:
+                raise Exception(f'Compiled profile version {version} is not supported')
+
+            header = json.loads(f.read(headerLen).decode('utf-8'))
+
+        if profile is not None and header['prfHash'] != cls.profileDigest(profile):
+            raise Exception('Compiled profile does not match the given profile')
+
+        fileMap = np.memmap(path, dtype='u1', mode='r')
+        arrays = []
+        for arrInfo in header['arrays']:
+            arrDtype = np.dtype(arrInfo['dtype'])
+            arrLen = int(np.prod(arrInfo['shape'])) * arrDtype.itemsize
+            arrBuf = fileMap[arrInfo['offset']:arrInfo['offset'] + arrLen]
+            arrays.append(arrBuf.view(arrDtype).reshape(arrInfo['shape']))
+
+        def decode(obj):
+            if not isinstance(obj, dict):
+                return obj
+            if '__array__' in obj:
+                return arrays[obj['__array__']]
+            if '__bytes__' in obj:
+                return memoryview(decode(obj['__bytes__']))
+            if '__list__' in obj:
+                items = [decode(x) for x in obj['__list__']]
+                return tuple(items) if obj['tuple'] else items
+            if '__dict__' in obj:
+                return {decode(k): decode(v) for k, v in obj['__dict__']}
+            if '__curve__' in obj:
+                lutY = decode(obj['__curve__'])
+                return iccCurve([None, lutY], lutY.dtype)
+            if '__inverse__' in obj:
+                lutX = decode(obj['__inverse__'])
+                return iccInverseCurve(lutX, obj['limits'], lutX.dtype)
+            if '__clut__' in obj:
+                table = decode(obj['__clut__'])
+                return iccCLUT(table, obj['method'], table.dtype)
+
+        prf = cls.__new__(cls)
+        prf.prfByte = memoryview(arrays[header['prfByte']])
+        prf.scratchBufs = {}
+        prf.prfStats = cls.defaultStats
+        prf.prfLazyLock = threading.RLock()
+        prf.prfPending = None
+        for key, value in header['state'].items():
+            setattr(prf, key, decode(value))
+
+        if prf.prfType == 'std':
+            prf.vTRCParaToLinearSingle = prf.trcParaToLinearSingle
+
+        return prf
+
+    def compiledSize(self) -> int:
+        # approximate memory held by the profile buffer, the compiled tables and the kept scratch buffers
+        self.materialize()
+        def objSize(obj):
+            if isinstance(obj, np.ndarray):
+                return obj.nbytes
+            if isinstance(obj, memoryview):
+                return obj.nbytes
+            if isinstance(obj, (list, tuple)):
+                return sum(objSize(x) for x in obj)
+            if isinstance(obj, dict):
+                return sum(objSize(x) for x in obj.values())
+            if isinstance(obj, (iccCurve, iccInverseCurve, iccCLUT)):
+                return objSize(obj.__dict__)
+            return 0
+
+        return objSize(self.__dict__)
+
+    def trcDecode(self, input, out = None):
+        # out: optional preallocated (..., 3) result buffer, every variant below
+        # writes each channel straight into it
+        self.materialize()
+        with self.stage('decode', np.size(input) // 3):
+            return self.trcDecodeDispatch(input, out)
+
+    def trcDecodeDispatch(self, input, out = None):
+        self.materialize()
+        if self.prfKnown:
+            return self.trcDecodeKnown(input, out)
+
         if self.prfType == 'std':
             if self.uniformTRC:
-                result = self.trcDecodeToLinearSingle(input)
+                result = self.trcDecodeToLinearSingle(input, out)
                 # result = self.trcDecodeToLinear_MP(input) # debug
             else:
-                result = self.trcDecodeToLinear_MP(input)
+                result = self.trcDecodeToLinear_MP(input, out)
             return result
         elif self.prfType == 'mab':
-            if self.uniformTRC:
-                result = self.trcDecodeA2B0Single(input)
+            if self.a2b0_Baked is not None:
+                # at most one 1D shaper pass, not worth the channel threads
+                input = np.asarray(input)
+                result = self.trcDecodeBlock(input, self.trcDecodeOut(input, out))
+            elif self.uniformTRC:
+                result = self.trcDecodeA2B0Single(input, out)
                 # result = self.trcDecodeA2B0_MP(input) # debug
             else:
-                result = self.trcDecodeA2B0_MP(input)
+                result = self.trcDecodeA2B0_MP(input, out)
             return result
         elif self.prfType == 'mft2':
             if self.uniformTRC:
-                result = self.trcDecodeToLinearSingle(input)
+                result = self.trcDecodeToLinearSingle(input, out)
                 # result = self.trcDecodeA2B0_MP(input) # debug
             else:
-                result = self.trcDecodeToLinear_MP(input)
+                result = self.trcDecodeToLinear_MP(input, out)
             return result
 
-    def trcDecodeToLinear_MP(self, input):
-        inRGB = [input[...,0], input[...,1], input[...,2]]
-        bufRGB = [None] * 3
+    #
+    # Scratch buffers for decode intermediates, reused across calls. Kept per thread
+    # since a transform can be shared (see iccRegistry) and channels decode concurrently,
+    # a thread only ever runs one decode step at a time so names are not per channel.
+    # Only buffers up to scratchKeepBytes are kept, enough for tiled decode, a whole
+    # large image decoded at once gets buffers that are freed with the call instead of
+    # staying pinned by the persistent channel threads.
+    #
+    scratchKeepBytes = 32 * 1024 * 1024
+
+    def scratch(self, name: str, shape, dtype = float):
+        size = int(np.prod(shape))
+        if size * np.dtype(dtype).itemsize > self.scratchKeepBytes:
+            return np.empty(shape, dtype=dtype)
+
+        # thread ident -> buffers, setdefault is atomic so threads never share a dict
+        bufs = self.scratchBufs.get(threading.get_ident())
+        if bufs is None:
+            bufs = self.scratchBufs.setdefault(threading.get_ident(), {})
+        key = (name, np.dtype(dtype).str)
+
+        buf = bufs.get(key)
+        if buf is None or buf.size < size:
+            buf = np.empty(size, dtype=dtype)
+            bufs[key] = buf
+
+        return buf[:size].reshape(shape)
+
+    def scratchBytes(self) -> int:
+        return sum(x.nbytes for bufs in list(self.scratchBufs.values()) for x in list(bufs.values()))
+
+    def releaseScratch(self):
+        # buffers of every thread, a decode running meanwhile keeps the ones it holds
+        self.scratchBufs = {}
+
+    @classmethod
+    def channelExecutor(cls):
+        # persistent per-channel worker threads, so their scratch buffers survive between calls
+        with cls.channelLock:
+            if cls.channelPool is None:
+                import concurrent.futures
+                cls.channelPool = concurrent.futures.ThreadPoolExecutor(max_workers=3, thread_name_prefix='icctrc')
+            return cls.channelPool
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            for x in range(3):
-                if self.trcTypes[x] == 'curv':
-                    bufRGB[x] = executor.submit(self.curveToLinearNP_Single, inRGB[x], x)
-                elif self.trcTypes[x] == 'para':
-                    # bufRGB[x] = executor.submit(self.vTRCParaToLinearSingle, inRGB[x], *self.trcParaParams[x])
-                    bufRGB[x] = executor.submit(self.paraCurveToLinearNP_Single, inRGB[x], x) # experimental note 1
-                else:
-                    raise Exception(f'TRC type {self.trcTypes[x]} is not supported')
+    #
+    # Integer input (uInt8 / uInt16), decoded by indexing a per-channel table
+    # that is built on first use for each bit depth
+    #
+    def trcDecodeInt(self, input):
+        self.materialize()
+        input = np.asarray(input)
+
+        if input.dtype not in (np.uint8, np.uint16):
+            raise Exception(f'Integer decode expects uint8 or uint16 input, got {input.dtype}')
+
+        result = np.empty(input.shape[:-1] + (3,), dtype=self.prfDtype)
+
+        with self.stage('decodeInt', result.size // 3):
+            return self.trcDecodeBlock(input, result)
+
+    def trcIntLUT(self, levels: int):
+        self.materialize()
+        if levels in self.trcIntLUTs:
+            return self.trcIntLUTs[levels]
+
+        ndx = np.arange(levels) / (levels - 1)
+
+        # the mAB table feeds the CLUT, so it stays in the compute precision
+        with self.stage('intLUT', levels):
+            mab = self.prfType == 'mab' and not self.prfKnown
+            if mab and self.a2b0_Baked is not None and self.a2b0_BakeShaper != 'A':
+                # the baked grid already covers the A curves
+                intLUT = np.repeat(ndx[:, None], 3, axis=1).astype(self.computeDtype)
+            elif mab:
+                intLUT = np.stack([self.paraCurveToLinearNP_SingleSA(ndx, self.a2b0_Acurves, x) for x in range(3)], axis=-1)
+                intLUT = np.ascontiguousarray(intLUT, dtype=self.computeDtype)
+            else:
+                intLUT = self.trcDecode(np.repeat(ndx[:, None], 3, axis=1), np.empty((levels, 3), dtype=self.prfDtype))
+        self.trcIntLUTs[levels] = intLUT
+
+        return intLUT
 
-        r = bufRGB[0].result()
-        g = bufRGB[1].result()
-        b = bufRGB[2].result()
-        rgb = np.stack((r, g, b), axis=-1)
-        # result = rgb
+    #
+    # Unique colour decode, pixels are packed into integer keys and every distinct
+    # colour goes through the transform (CLUT included) only once
+    #
+    def uniqueColours(self, input):
+        # returns (unique (n, 3) pixel values, (n,) counts, (pixels,) inverse index)
+        input = np.asarray(input)
+        flat = np.ascontiguousarray(input.reshape(-1, 3))
+
+        if flat.dtype == np.uint8 and flat.shape[0] >= self.uniqueDenseMin:
+            # dense 24 bit histogram, linear in the pixel count instead of a sort
+            keys = (flat[:, 0].astype(np.uint32) << 16) | (flat[:, 1].astype(np.uint32) << 8) | flat[:, 2]
+            keyCounts = np.bincount(keys, minlength=1 << 24)
+            keyUnique = np.flatnonzero(keyCounts)
+
+            rank = np.zeros(1 << 24, dtype=np.intp)
+            rank[keyUnique] = np.arange(keyUnique.shape[0])
+
+            unique = np.stack([keyUnique >> 16, (keyUnique >> 8) & 0xFF, keyUnique & 0xFF], axis=-1).astype(np.uint8)
+            return unique, keyCounts[keyUnique], rank[keys]
+
+        if flat.dtype in (np.uint8, np.uint16):
+            bits = flat.dtype.itemsize * 8
+            keys = (flat[:, 0].astype(np.uint64) << (2 * bits)) | (flat[:, 1].astype(np.uint64) << bits) | flat[:, 2]
+            keyUnique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+            mask = (1 << bits) - 1
+            unique = np.stack([keyUnique >> (2 * bits), (keyUnique >> bits) & mask, keyUnique & mask], axis=-1).astype(flat.dtype)
+            return unique, counts, inverse.reshape(-1)
+
+        # float pixels, the three channels are compared as one raw key
+        keys = flat.view(np.dtype((np.void, flat.dtype.itemsize * 3))).reshape(-1)
+        keyUnique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+        return keyUnique.view(flat.dtype).reshape(-1, 3), counts, inverse.reshape(-1)
+
+    def trcDecodeUnique(self, input, scatter: bool = False, out = None):
+        # scatter=False: (decoded unique colours, pixel counts), usable as weights
+        # scatter=True: full size result, same as trcDecode / trcDecodeInt
+        self.materialize()
+        input = np.asarray(input)
+        with self.stage('unique', input.size // 3):
+            unique, counts, inverse = self.uniqueColours(input)
+
+        with self.stage('decodeUnique', unique.shape[0]):
+            decoded = self.trcDecodeBlock(unique, np.empty(unique.shape, dtype=self.prfDtype))
+
+        if not scatter:
+            return decoded, counts
+
+        if out is None:
+            out = np.empty(input.shape[:-1] + (3,), dtype=self.prfDtype)
+        if out.flags.c_contiguous:
+            np.take(decoded, inverse, axis=0, out=out.reshape(-1, 3))
+        else:
+            out[...] = decoded[inverse].reshape(out.shape)
 
-        return rgb
+        return out
 
     #
-    # Deprecated, only use when Multiprocess didn't work
+    # Tiled decode, the image is decoded in blocks of rows so the temporaries
+    # only ever cover one block regardless of the image size
+    #
+    def trcDecodeTiled(self, input, tileRows: int = 0, out = None):
+        self.materialize()
+        input = np.asarray(input)
+        tileRows = tileRows if tileRows > 0 else self.autoTileRows(input)
+
+        if out is None:
+            out = np.empty(input.shape[:-1] + (3,), dtype=self.prfDtype)
+
+        with self.stage('decodeTiled', out.size // 3):
+            for x in range(0, input.shape[0], tileRows):
+                self.trcDecodeBlock(input[x:x+tileRows], out[x:x+tileRows])
+
+        return out
+
+    def trcDecodeTiles(self, input, tileRows: int = 0):
+        # generator form, yields (first row, last row + 1, decoded block)
+        self.materialize()
+        input = np.asarray(input)
+        tileRows = tileRows if tileRows > 0 else self.autoTileRows(input)
+
+        for x in range(0, input.shape[0], tileRows):
+            block = input[x:x+tileRows]
+            out = np.empty(block.shape[:-1] + (3,), dtype=self.prfDtype)
+            yield x, x + block.shape[0], self.trcDecodeBlock(block, out)
+
+    def autoTileRows(self, input) -> int:
+        rowPixels = max(1, int(np.prod(input.shape[1:-1])))
+        return max(1, self.tilePixels // rowPixels)
+
+    def trcDecodeBlock(self, input, out):
+        # single threaded decode of one block, written channel by channel into out
+        self.materialize()
+        intInput = input.dtype in (np.uint8, np.uint16)
+        if intInput:
+            intLUT = self.trcIntLUT(np.iinfo(input.dtype).max + 1)
+
+        mab = self.prfType == 'mab' and not self.prfKnown
+        work = self.trcDecodeWork(out) if mab else out
+        pixels = out.size // 3
+
+        if self.prfKnown and not intInput:
+            with self.stage('trc', pixels):
+                return self.trcDecodeKnown(input, out)
+
+        # a baked A2B0 grid replaces the CLUT and whichever curves it covers
+        baked = self.a2b0_Baked if mab else None
+        curvesA = baked is None or self.a2b0_BakeShaper == 'A'
+        curvesM = baked is None or self.a2b0_BakeShaper == 'M'
+
+        if mab and not intInput and not curvesA:
+            # the grid reads the encoded input directly
+            work = input
+        else:
+            with self.stage('curvesA' if mab else 'trc', pixels):
+                for x in range(3):
+                    if intInput:
+                        np.take(intLUT[:, x], input[..., x], out=work[..., x], mode='clip')
+                    elif mab:
+                        self.paraCurveToLinearNP_SingleSA(input[..., x], self.a2b0_Acurves, x, work[..., x])
+                    else:
+                        self.trcDecodeChannel(input[..., x], x, out[..., x])
+
+        if mab:
+            # with integer input the table above already covers the A curves
+            with self.stage('clut', pixels):
+                lut = baked if baked is not None else self.a2b0_LUTapp
+                work = lut.apply(work, out=self.trcDecodeWork(out) if curvesM else out)
+            if curvesM:
+                with self.stage('curvesM', pixels):
+                    for x in range(3):
+                        self.paraCurveToLinearNP_SingleSA(work[..., x], self.a2b0_Mcurves, x, out[..., x])
+
+        return out
+
+    def trcDecodeParallel(self, input, pool = None, out = None):
+        # spatially split decode over a persistent process pool, see iccDecodePool
+        self.materialize()
+        pool = pool if pool is not None else iccDecodePool.default()
+        with self.stage('decodeParallel', np.size(input) // 3):
+            return pool.decode(self, input, out)
+
     #
-    def trcDecodeToLinear_SP(self, input):
-        inRGB = [input[...,0], input[...,1], input[...,2]]
+    # Fused decode to chromaticity coordinates, encoded pixels -> linear RGB -> XYZ
+    # -> CIE 1931 xy or CIE 1976 u'v' in one chunked pass, only a chunk of linear RGB
+    # and XYZ is ever held instead of full image intermediates
+    #
+    def rgbToXYZMatrix(self) -> np.ndarray:
+        self.materialize()
+        if self.prfRGBtoXYZ is None:
+            if self.primariesCA is None:
+                self.profileFromEmbed()
+            # same matrix colour.RGB_Colourspace builds for profileFromEmbed
+            import colour
+            self.prfRGBtoXYZ = colour.normalised_primary_matrix(np.reshape(self.primariesCA, (3, 2)), self.prfWhite)
+        return self.prfRGBtoXYZ
+
+    def trcDecodeChromaticity(self, input, space: str = 'xy', out = None):
+        # space: 'xy' (CIE 1931) or 'uv' (CIE 1976 u'v'), black pixels map to 0, 0 like colour.XYZ_to_xy
+        self.materialize()
+        if space not in self.chromaWeights:
+            raise Exception(f'Chromaticity space {space} is not supported')
+
+        input = np.asarray(input)
+        if out is None:
+            out = np.empty(input.shape[:-1] + (2,), dtype=self.prfDtype)
+
+        inFlat = input.reshape(-1, 3)
+        copyBack = not out.flags.c_contiguous
+        outFlat = np.empty((inFlat.shape[0], 2), dtype=out.dtype) if copyBack else out.reshape(-1, 2)
+
+        mtx = self.rgbToXYZMatrix().T.astype(self.computeDtype)
+        numX, numY, denom = self.chromaWeights[space]
+        # weights folded into the matrix, so a chunk is one matmul to (numerator x, numerator y, denominator)
+        mtx = mtx @ np.array([[numX, 0, denom[0]], [0, numY, denom[1]], [0, 0, denom[2]]], dtype=self.computeDtype)
+
+        for x in range(0, inFlat.shape[0], self.chromaPixels):
+            chunk = inFlat[x:x+self.chromaPixels]
+            shape = chunk.shape
+
+            lin = self.trcDecodeBlock(chunk, self.scratch('lin', shape, self.computeDtype))
+
+            with self.stage('chromaticity', shape[0]):
+                nxy = np.matmul(lin, mtx, out=self.scratch('nxy', shape, self.computeDtype))
+
+                den = nxy[:, 2]
+                np.divide(1, den, out=den, where=np.not_equal(den, 0, out=self.scratch('mask', den.shape, bool)))
+                np.multiply(nxy[:, :2], den[:, None], out=outFlat[x:x+self.chromaPixels], casting='same_kind')
+
+        if copyBack:
+            out[...] = outFlat.reshape(out.shape)
+
+        return out
+
+    def trcChromaHistogram(self, input, space: str = 'xy', bins = 512, extent = None, tileRows: int = 0):
+        # density of the image on the diagram, see iccChromaHistogram
+        return iccChromaHistogram(space, bins, extent).accumulate(self, input, tileRows)
+
+    def trcGamutCoverage(self, input, gamuts = ('sRGB', 'Display P3', 'ITU-R BT.2020'), space: str = 'xy', tileRows: int = 0) -> dict:
+        # share of the image pixels inside each reference gamut, see iccGamutCoverage
+        return iccGamutCoverage(gamuts, space).accumulate(self, input, tileRows).results()
+
+    #
+    # Encode, linear RGB back to the profile encoding through the inverse of every
+    # channel curve (matrix/TRC curves and mft2 input tables). Same layout, precision
+    # and threading as trcDecode.
+    #
+    def trcEncode(self, input, out = None):
+        self.materialize()
+        input = np.asarray(input)
+        if input.dtype.kind != 'f':
+            input = input.astype(self.computeDtype)
+
+        with self.stage('encode', np.size(input) // 3):
+            return self.trcEncodeDispatch(input, out)
+
+    def trcEncodeDispatch(self, input, out = None):
+        self.materialize()
+        if self.prfKnown:
+            return self.trcEncodeKnown(input, out)
+
+        if self.prfType == 'mab':
+            # the A2B0 CLUT sits between the curves, there is no per-channel inverse
+            raise Exception('Encode is not supported for A2B0 mAB profiles')
+
+        if self.uniformTRC:
+            out = self.trcDecodeOut(input, out, np.shape(input))
+            return self.trcEncodeChannel(input, 0, out)
+
+        out = self.trcDecodeOut(input, out)
         bufRGB = [None] * 3
 
+        executor = self.channelExecutor()
         for x in range(3):
-            if self.trcTypes[x] == 'curv':
-                bufRGB[x] = self.curveToLinearNP_Single(inRGB[x], x)
-            elif self.trcTypes[x] == 'para':
-                # bufRGB[x] = self.vTRCParaToLinearSingle(inRGB[x], *self.trcParaParams[x])
-                bufRGB[x] = self.paraCurveToLinearNP_Single(inRGB[x], x) # experimental note 1
-        
-        r = bufRGB[0]
-        g = bufRGB[1]
-        b = bufRGB[2]
-        rgb = np.stack((r, g, b), axis=-1)
-        # result = rgb
-
-        return rgb
-
-    def trcDecodeToLinearSingle(self, input):
-        if self.trcTypes[0] == 'curv':
-            result = self.curveToLinearNP_Single(input, 0)
-        elif self.trcTypes[0] == 'para':
-            # result = self.vTRCParaToLinearSingle(input, *self.trcParaParams[0])
-            result = self.paraCurveToLinearNP_Single(input, 0) # experimental note 1
+            bufRGB[x] = executor.submit(self.trcEncodeChannel, input[...,x], x, out[...,x])
+
+        for x in range(3):
+            bufRGB[x].result()
+
+        return out
+
+    def trcEncodeChannel(self, input, channel: int, out = None):
+        self.materialize()
+        if self.trcTypes[channel] == 'curv':
+            if self.trcCurvLens[channel] == 1:
+                # negative input has no defined value for a fractional exponent
+                out = np.maximum(input, 0, out=out, casting='same_kind')
+                return np.power(out, 1 / self.trcCurvGammas[channel], out=out)
+            return self.curveApply(self.trcInverse[channel], input, channel, out)
+        elif self.trcTypes[channel] == 'para':
+            return self.paraCurveToEncodedNP_Single(input, channel, out)
+        else:
+            raise Exception(f'TRC type {self.trcTypes[channel]} is not supported')
+
+    def paraCurveToEncodedNP_Single(self, input: float, channel: int, out = None) -> float:
+        # always the analytic inverse, also when decode uses a para LUT (experimental note 1)
+        shape = np.shape(input)
+
+        res = out if out is not None and out.dtype == self.computeDtype else self.scratch('res', shape, self.computeDtype)
+        self.trcParaToEncodedSingle(
+            input, *self.trcParaParams[channel],
+            out=res,
+            low=self.scratch('low', shape, self.computeDtype),
+            mask=self.scratch('mask', shape, bool)
+        )
+
+        if out is None:
+            return res.copy()
+        if res is not out:
+            np.copyto(out, res, casting='same_kind')
+        return out
+
+    def trcDecodeKnown(self, input, out = None):
+        # closed form transfer function of a well-known profile, same for every channel
+        out = self.trcDecodeOut(input, out, np.shape(input))
+        return self.knownApply(self.trcTransferToLinear, input, out, self.knownScale, 1)
+
+    def trcEncodeKnown(self, input, out = None):
+        out = self.trcDecodeOut(input, out, np.shape(input))
+        return self.knownApply(self.trcTransferToEncoded, input, out, 1, 1 / self.knownScale)
+
+    def knownApply(self, func, input, out, outScale: float, inScale: float):
+        shape = np.shape(input)
+
+        # computed in place when out already has the compute precision
+        res = out if out.dtype == self.computeDtype else self.scratch('res', shape, self.computeDtype)
+        if inScale != 1:
+            input = np.multiply(input, inScale, out=res)
+        func(
+            input, self.knownTransfer,
+            out=res,
+            low=self.scratch('low', shape, self.computeDtype),
+            mask=self.scratch('mask', shape, bool),
+            dtype=self.computeDtype
+        )
+        if outScale != 1:
+            res *= outScale
+
+        if res is not out:
+            np.copyto(out, res, casting='same_kind')
+        return out
+
+    def trcDecodeOut(self, input, out, shape = None):
+        if out is None:
+            shape = shape if shape is not None else np.shape(input)[:-1] + (3,)
+            out = np.empty(shape, dtype=self.prfDtype)
+        return out
+
+    def trcDecodeWork(self, out):
+        # buffer for the intermediate A2B0 stages, out itself unless it is
+        # stored in a lower precision than the computation
+        if out.dtype == self.computeDtype:
+            return out
+        return self.scratch('stage', out.shape, self.computeDtype)
+
+    def trcDecodeChannel(self, input, channel: int, out = None):
+        self.materialize()
+        if self.trcTypes[channel] == 'curv':
+            return self.curveToLinearNP_Single(input, channel, out)
+        elif self.trcTypes[channel] == 'para':
+            return self.paraCurveToLinearNP_Single(input, channel, out)
         else:
-            raise Exception(f'TRC type {self.trcTypes[0]} is not supported')
-        return result
+            raise Exception(f'TRC type {self.trcTypes[channel]} is not supported')
+
+    def trcDecodeToLinear_MP(self, input, out = None):
+        out = self.trcDecodeOut(input, out)
+        bufRGB = [None] * 3
+
+        executor = self.channelExecutor()
+        for x in range(3):
+            bufRGB[x] = executor.submit(self.trcDecodeChannel, input[...,x], x, out[...,x])
+
+        for x in range(3):
+            bufRGB[x].result()
+
+        return out
 
-    def curveToLinearNP_Single(self, input: float, channel: int) -> float:
+    #
+    # Deprecated, only use when Multiprocess didn't work
+    #
+    def trcDecodeToLinear_SP(self, input, out = None):
+        out = self.trcDecodeOut(input, out)
+
+        for x in range(3):
+            self.trcDecodeChannel(input[...,x], x, out[...,x])
+
+        return out
+
+    def trcDecodeToLinearSingle(self, input, out = None):
+        out = self.trcDecodeOut(input, out, np.shape(input))
+        return self.trcDecodeChannel(input, 0, out)
+
+    def curveToLinearNP_Single(self, input: float, channel: int, out = None) -> float:
         if self.trcCurvLens[channel] == 1:
-            calc = input ** self.trcCurvGammas[channel]
+            calc = np.power(input, self.trcCurvGammas[channel], out=out)
             return calc
         else:
-            # use scipy interpolate to extrapolate values over 1.0 (HDR)
-            f = interpolate.interp1d(self.trcCurvLUTs[channel][0], self.trcCurvLUTs[channel][1], fill_value='extrapolate')
-            return f(input)
+            return self.curveApply(self.trcCurves[channel], input, channel, out)
+
+    def curveApply(self, curve, input, channel: int, out = None):
+        shape = np.shape(input)
+        return curve.apply(
+            input, out, 
+            self.scratch('pos', shape, self.computeDtype), 
+            self.scratch('ndx', shape, np.intp), 
+            self.scratch('val', shape, self.computeDtype)
+        )
+
+    def trcDecodeA2B0Single(self, input, out = None):
+        out = self.trcDecodeOut(input, out)
+        work = self.trcDecodeWork(out)
+        pixels = out.size // 3
+
+        with self.stage('curvesA', pixels):
+            self.paraCurveToLinearNP_SingleSA(input, self.a2b0_Acurves, 0, work)
+        with self.stage('clut', pixels):
+            self.a2b0_LUTapp.apply(work, out=work)
+        with self.stage('curvesM', pixels):
+            self.paraCurveToLinearNP_SingleSA(work, self.a2b0_Mcurves, 0, out)
+
+        return out
+
+    def trcDecodeA2B0_MP(self, input, out = None):
+        out = self.trcDecodeOut(input, out)
+        work = self.trcDecodeWork(out)
+        pixels = out.size // 3
+        bufRGB = [None] * 3
 
-            # numpy version
-            # return np.interp(input, self.trcCurvLUTs[channel][0], self.trcCurvLUTs[channel][1])
+        executor = self.channelExecutor()
+        with self.stage('curvesA', pixels):
+            for x in range(3):
+                bufRGB[x] = executor.submit(self.paraCurveToLinearNP_SingleSA, input[...,x], self.a2b0_Acurves, x, work[...,x])
 
-    def trcDecodeA2B0Single(self, input):
-        x = self.paraCurveToLinearNP_SingleSA(input, self.a2b0_Atrc, 0)
-        y = self.a2b0_LUTapp.apply(x)
-        result = self.paraCurveToLinearNP_SingleSA(y, self.a2b0_Mtrc, 0)
-        return result
+            for x in range(3):
+                bufRGB[x].result()
 
-    def trcDecodeA2B0_MP(self, input):
-        inRGB = [input[...,0], input[...,1], input[...,2]]
-        bufRGB = [None] * 3
+        with self.stage('clut', pixels):
+            self.a2b0_LUTapp.apply(work, out=work)
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
+        with self.stage('curvesM', pixels):
             for x in range(3):
-                bufRGB[x] = executor.submit(self.paraCurveToLinearNP_SingleSA, inRGB[x], self.a2b0_Atrc, x)
+                bufRGB[x] = executor.submit(self.paraCurveToLinearNP_SingleSA, work[...,x], self.a2b0_Mcurves, x, out[...,x])
 
-        rA = bufRGB[0].result()
-        gA = bufRGB[1].result()
-        bA = bufRGB[2].result()
-        rgbA = np.stack((rA, gA, bA), axis=-1)
+            for x in range(3):
+                bufRGB[x].result()
 
-        B = self.a2b0_LUTapp.apply(rgbA)
+        return out
 
-        RGB_A = [B[...,0], B[...,1], B[...,2]]
-        bufRGB_A = [None] * 3
+    def paraCurveToLinearNP_Single(self, input: float, channel: int, out = None) -> float:
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            for x in range(3):
-                bufRGB_A[x] = executor.submit(self.paraCurveToLinearNP_SingleSA, RGB_A[x], self.a2b0_Mtrc, x)
+        if self.trcCurvLUTs[channel] is None:
+            shape = np.shape(input)
 
-        rB = bufRGB_A[0].result()
-        gB = bufRGB_A[1].result()
-        bB = bufRGB_A[2].result()
-        rgbB = np.stack((rB, gB, bB), axis=-1)
+            # computed in place when out already has the compute precision
+            res = out if out is not None and out.dtype == self.computeDtype else self.scratch('res', shape, self.computeDtype)
+            self.trcParaToLinearSingle(
+                input, *self.trcParaParams[channel], 
+                out=res, 
+                low=self.scratch('low', shape, self.computeDtype), 
+                mask=self.scratch('mask', shape, bool)
+            )
 
-        # result = rgbB
-        
-        return rgbB
+            if out is None:
+                return res.copy()
+            if res is not out:
+                np.copyto(out, res, casting='same_kind')
+            return out
+
+        # experimental note 1
+        return self.curveApply(self.trcCurves[channel], input, channel, out)
 
     #
-    # experimental note 1
+    # Standalone
     #
-    def paraCurveToLinearNP_Single(self, input: float, channel: int) -> float:
+    def paraCurveToLinearNP_SingleSA(self, input: float, trc, channel: int, out = None) -> float:
 
-        # use scipy interpolate to extrapolate values over 1.0 (HDR)
-        f = interpolate.interp1d(self.trcCurvLUTs[channel][0], self.trcCurvLUTs[channel][1], fill_value='extrapolate')
-        return f(input)
+        if isinstance(trc[channel], iccCurve):
+            return self.curveApply(trc[channel], input, channel, out)
 
-        # numpy version
-        # return np.interp(input, self.trcCurvLUTs[channel][0], self.trcCurvLUTs[channel][1])
+        # plain [x, y] table, use scipy interpolate to extrapolate values over 1.0 (HDR)
+        from scipy import interpolate
+        f = interpolate.interp1d(trc[channel][0], trc[channel][1], fill_value='extrapolate')
+        if out is None:
+            return f(input)
+        out[...] = f(input)
+        return out
 
     #
-    # Standalone
+    # ICC parametric curve, evaluated over whole arrays
+    # args: g, a, b, c, d, e, f depending on the function type (0-4)
+    # out, low and mask are optional buffers for the result and the intermediates
     #
-    def paraCurveToLinearNP_SingleSA(self, input: float, trc, channel: int) -> float:
+    def trcParaToLinearSingle(self, x: float, *args, out = None, low = None, mask = None, dtype = float) -> float:
+        x = np.asarray(x)
+        if x.dtype.kind != 'f':
+            x = x.astype(dtype)
 
-        # use scipy interpolate to extrapolate values over 1.0 (HDR)
-        f = interpolate.interp1d(trc[channel][0], trc[channel][1], fill_value='extrapolate')
-        return f(input)
+        if out is None:
+            out = np.empty(x.shape, dtype=dtype)
 
-    def trcParaToLinearSingle(self, x: float, *args) -> float:
         if len(args) == 1:
-            Y = pow(x, args[0])
-            return Y
+            # negative input has no defined value for a fractional exponent
+            np.maximum(x, 0, out=out)
+            return np.power(out, args[0], out=out)
+
+        if len(args) == 3 or len(args) == 4:
+            xThres = -args[2] / args[1]
+        elif len(args) == 5 or len(args) == 7:
+            xThres = args[4]
+        else:
+            out[...] = 0
+            return out
 
-        elif len(args) == 3:
-            if x >= (-args[2] / args[1]):
-                Y = pow(((args[1] * x) + args[2]), args[0])
-            elif x < (-args[2] / args[1]):
-                Y = 0
-            return Y
+        # everything that reads x is done before out is written, out may be x itself
+        mask = np.greater_equal(x, xThres, out=mask)
+        np.logical_not(mask, out=mask)
 
-        elif len(args) == 4:
-            if x >= (-args[2] / args[1]):
-                Y = pow(((args[1] * x) + args[2]), args[0]) + args[3]
-            elif x < (-args[2] / args[1]):
-                Y = args[3]
-            return Y
+        if len(args) == 5 or len(args) == 7:
+            low = np.multiply(x, args[3], out=low)
+            if len(args) == 7:
+                low += args[6]
 
+        np.multiply(x, args[1], out=out)
+        out += args[2]
+        np.maximum(out, 0, out=out)
+        np.power(out, args[0], out=out)
+
+        if len(args) == 3:
+            np.copyto(out, 0, where=mask)
+        elif len(args) == 4:
+            out += args[3]
+            np.copyto(out, args[3], where=mask)
         elif len(args) == 5:
-            if x >= args[4]:
-                Y = pow(((args[1] * x) + args[2]), args[0])
-            elif x < args[4]:
-                Y = (args[3] * x)
-            return Y
+            np.copyto(out, low, where=mask)
+        elif len(args) == 7:
+            out += args[5]
+            np.copyto(out, low, where=mask)
+
+        return out
+
+    #
+    # Inverse of trcParaToLinearSingle, same arguments and buffers
+    #
+    # The curved segment (ax + b)^g (+ c or + e) inverts to (y^(1/g) - b) / a after the
+    # offset is removed, the linear segment cx (+ f) to y / c. Values below the curved
+    # segment of types 1 and 2 map to the -b/a threshold, where decode flattens out.
+    #
+    def trcParaToEncodedSingle(self, y: float, *args, out = None, low = None, mask = None, dtype = float) -> float:
+        y = np.asarray(y)
+        if y.dtype.kind != 'f':
+            y = y.astype(dtype)
+
+        if out is None:
+            out = np.empty(y.shape, dtype=dtype)
+
+        if len(args) not in (1, 3, 4, 5, 7):
+            out[...] = 0
+            return out
+
+        g = args[0]
+
+        # everything that reads y is done before out is written, out may be y itself
+        if len(args) == 5 or len(args) == 7:
+            a, b, c, d = args[1:5]
+            yThres = max(a * d + b, 0) ** g + (args[5] if len(args) == 7 else 0)
+            mask = np.less(y, yThres, out=mask)
+
+            if len(args) == 7:
+                low = np.subtract(y, args[6], out=low)
+            elif low is None:
+                low = y.astype(dtype)
+            else:
+                np.copyto(low, y, casting='same_kind')
+            if c != 0:
+                low /= c
+            else:
+                low[...] = 0
 
+        if len(args) == 4:
+            np.subtract(y, args[3], out=out)
         elif len(args) == 7:
-            if x >= args[4]:
-                Y = pow(((args[1] * x) + args[2]), args[0]) + args[5]
-            elif x < args[4]:
-                Y = ((args[3] * x) + args[6])
-            return Y
+            np.subtract(y, args[5], out=out)
+        else:
+            np.copyto(out, y, casting='same_kind')
+
+        np.maximum(out, 0, out=out)
+        np.power(out, 1 / g, out=out)
 
+        if len(args) > 1:
+            out -= args[2]
+            out /= args[1]
+
+        if len(args) == 5 or len(args) == 7:
+            np.copyto(out, low, where=mask)
+
+        return out
+
+    #
+    # Closed form transfer functions of the well-known profiles, the para ones through
+    # trcParaToLinearSingle, PQ is the SMPTE ST 2084 EOTF and HLG the inverse ARIB
+    # STD-B67 OETF. Same buffers as trcParaToLinearSingle, out may be x itself.
+    #
+    def trcTransferToLinear(self, x: float, transfer: str, out = None, low = None, mask = None, dtype = float) -> float:
+        if self.knownTransfers[transfer] is not None:
+            return self.trcParaToLinearSingle(x, *self.knownTransfers[transfer], out=out, low=low, mask=mask, dtype=dtype)
+
+        x = np.asarray(x)
+        if out is None:
+            out = np.empty(x.shape, dtype=dtype)
+
+        if transfer == 'pq':
+            m1, m2, c1, c2, c3 = self.pqConstants
+            np.maximum(x, 0, out=out)
+            np.power(out, 1 / m2, out=out)
+            low = np.multiply(out, -c3, out=low)
+            low += c2
+            out -= c1
+            np.maximum(out, 0, out=out)
+            out /= low
+            np.power(out, 1 / m1, out=out)
+        elif transfer == 'hlg':
+            a, b, c = self.hlgConstants
+            mask = np.less_equal(x, 0.5, out=mask)
+            low = np.maximum(x, 0, out=low)
+            np.square(low, out=low)
+            low /= 3
+            np.subtract(x, c, out=out)
+            out /= a
+            np.exp(out, out=out)
+            out += b
+            out /= 12
+            np.copyto(out, low, where=mask)
         else:
-            return 0
+            raise Exception(f'Transfer function {transfer} is not supported')
+
+        return out
+
+    def trcTransferToEncoded(self, y: float, transfer: str, out = None, low = None, mask = None, dtype = float) -> float:
+        if self.knownTransfers[transfer] is not None:
+            return self.trcParaToEncodedSingle(y, *self.knownTransfers[transfer], out=out, low=low, mask=mask, dtype=dtype)
+
+        y = np.asarray(y)
+        if out is None:
+            out = np.empty(y.shape, dtype=dtype)
+
+        if transfer == 'pq':
+            m1, m2, c1, c2, c3 = self.pqConstants
+            np.maximum(y, 0, out=out)
+            np.power(out, m1, out=out)
+            low = np.multiply(out, c3, out=low)
+            low += 1
+            out *= c2
+            out += c1
+            out /= low
+            np.power(out, m2, out=out)
+        elif transfer == 'hlg':
+            a, b, c = self.hlgConstants
+            mask = np.less_equal(y, 1 / 12, out=mask)
+            low = np.maximum(y, 0, out=low)
+            low *= 3
+            np.sqrt(low, out=low)
+            # the log segment is clamped at its lower end, below it the square root applies
+            np.multiply(y, 12, out=out)
+            out -= b
+            np.maximum(out, 1 - b, out=out)
+            np.log(out, out=out)
+            out *= a
+            out += c
+            np.copyto(out, low, where=mask)
+        else:
+            raise Exception(f'Transfer function {transfer} is not supported')
+
+        return out
+
     #
     # experimental note 1
     #
     def trcParaToCurv(self, *args):
-        LUTndx = []
-        LUTlist = []
 
         # increase LUT length to increase accuracy
         LUTlen = 8192
 
         args = np.array(args, dtype=float)[0]
 
-        for xI in range(LUTlen):
-            x = xI / (LUTlen - 1)
-
-            if len(args) == 1:
-                Y = pow(x, args[0])
-
-            elif len(args) == 3:
-                if x >= (-args[2] / args[1]):
-                    Y = pow(((args[1] * x) + args[2]), args[0])
-                elif x < (-args[2] / args[1]):
-                    Y = 0
-
-            elif len(args) == 4:
-                if x >= (-args[2] / args[1]):
-                    Y = pow(((args[1] * x) + args[2]), args[0]) + args[3]
-                elif x < (-args[2] / args[1]):
-                    Y = args[3]
-
-            elif len(args) == 5:
-                if x >= args[4]:
-                    Y = pow(((args[1] * x) + args[2]), args[0])
-                elif x < args[4]:
-                    Y = (args[3] * x)
-
-            elif len(args) == 7:
-                if x >= args[4]:
-                    Y = pow(((args[1] * x) + args[2]), args[0]) + args[5]
-                elif x < args[4]:
-                    Y = ((args[3] * x) + args[6])
-
-            LUTndx.append(x)
-            LUTlist.append(Y)
+        LUTndx = np.arange(LUTlen) / (LUTlen - 1)
+        with self.stage('paraToCurv', LUTlen):
+            LUTlist = self.trcParaToLinearSingle(LUTndx, *args)
 
         tb = np.array([LUTndx, LUTlist], dtype=float)
 
@@ -670,33 +2127,7 @@ class iccToTRC:
 
     def curvModeGetTable(self, tag: str):
 
-        curveLen = int.from_bytes(self.extractICCtag(tag)[8:12], 'big')
-        curveCont = self.extractICCtag(tag)[12:]
-
-        if curveLen == 1:
-            return False
-
-        LUTndx = []
-        LUTlist = []
-
-        for x in range(curveLen*2):
-            if x % 2 != 0:
-                continue
-            ndx = int(x/2)
-            LUTndx.append(ndx)
-            LUTlist.append(int.from_bytes(curveCont[x:x+2], 'big'))
-
-        LUTndxN = np.array(LUTndx)
-        LUTlistN = np.array(LUTlist)
-
-        xMax = np.max(LUTndxN)
-        yMax = np.max(LUTlistN)
-
-        xNorm = np.array(LUTndxN / xMax)
-        yNorm = np.array(LUTlistN / yMax)
-
-        tb = np.array([xNorm, yNorm])
-        return tb
+        return self.curvModeGetTableSA(self.extractICCtag(tag))
 
     #
     # Standalone
@@ -704,7 +2135,6 @@ class iccToTRC:
     def curvModeGetTableSA(self, byteIn):
 
         curveLen = int.from_bytes(byteIn[8:12], 'big')
-        curveCont = byteIn[12:]
 
         if curveLen == 1:
             return False
@@ -712,32 +2142,11 @@ class iccToTRC:
             # Identity function
             return np.array([[0, 1], [0, 1]], dtype='float')
 
-        LUTndx = []
-        LUTlist = []
-
-        for x in range(curveLen*2):
-            if x % 2 != 0:
-                continue
-            ndx = int(x/2)
-            LUTndx.append(ndx)
-            LUTlist.append(int.from_bytes(curveCont[x:x+2], 'big'))
-
-        LUTndxN = np.array(LUTndx)
-        LUTlistN = np.array(LUTlist)
-
-        xMax = np.max(LUTndxN)
-        yMax = np.max(LUTlistN)
-
-        xNorm = np.array(LUTndxN / xMax)
-        yNorm = np.array(LUTlistN / yMax)
-
-        tb = np.array([xNorm, yNorm])
-        return tb
+        return self.curveTableFromBufferSA(byteIn[12:], curveLen)
 
     def a2b0MFT2GetTableSA(self, byteIn):
 
         curveLen = round(len(byteIn) / 2)
-        curveCont = byteIn
 
         if curveLen == 1:
             return False
@@ -745,60 +2154,60 @@ class iccToTRC:
             # Identity function
             return np.array([[0, 1], [0, 1]], dtype='float')
 
-        LUTndx = []
-        LUTlist = []
-
-        for x in range(curveLen*2):
-            if x % 2 != 0:
-                continue
-            ndx = int(x/2)
-            LUTndx.append(ndx)
-            LUTlist.append(int.from_bytes(curveCont[x:x+2], 'big'))
+        return self.curveTableFromBufferSA(byteIn, curveLen)
 
-        LUTndxN = np.array(LUTndx)
-        LUTlistN = np.array(LUTlist)
+    def curveTableFromBufferSA(self, byteIn, curveLen: int) -> np.ndarray:
 
-        xMax = np.max(LUTndxN)
-        yMax = np.max(LUTlistN)
+        # big-endian uInt16 entries, decoded in bulk straight from the buffer
+        with self.stage('curveTable', curveLen):
+            LUTlistN = np.frombuffer(byteIn, dtype='>u2', count=curveLen)
 
-        xNorm = np.array(LUTndxN / xMax)
-        yNorm = np.array(LUTlistN / yMax)
+            xNorm = np.arange(curveLen) / (curveLen - 1)
+            yNorm = LUTlistN / np.max(LUTlistN)
 
-        tb = np.array([xNorm, yNorm])
+            tb = np.array([xNorm, yNorm])
         return tb
 
+    #
+    # Standalone
+    #
+    # Parse three consecutive curv / para curves (A, M or B curves of an mAB tag),
+    # each curve is padded to a 4 byte boundary
+    #
+    def curveSetParseSA(self, byteIn) -> list:
+        curves = []
+        pos = 0
+
+        for x in range(3):
+            curveBuf = byteIn[pos:]
+            curveType = self.tagTypeSA(curveBuf)
+
+            if curveType == 'curv':
+                curveLen = int.from_bytes(curveBuf[8:12], 'big')
+                if curveLen == 1:
+                    curves.append(self.trcParaToCurv([self.u8Fixed8NumberToFloat(curveBuf[12:14])]))
+                else:
+                    curves.append(self.curvModeGetTableSA(curveBuf))
+                curveSize = 12 + (curveLen * 2)
+            elif curveType == 'para':
+                paraParams = self.parametricParseSA(curveBuf)
+                curves.append(self.trcParaToCurv(paraParams))
+                curveSize = 12 + (len(paraParams) * 4)
+            else:
+                raise Exception(f'Curve type {curveType} is not supported')
+
+            pos += (curveSize + 3) & ~3
+
+        return curves
+
+    def tablesUniformSA(self, tables) -> bool:
+        return all(np.array_equal(x, tables[0]) for x in tables)
+
     def parametricParse(self, tag: str) -> list:
         paraParams = []
 
-        if self.trcType == 'para':
-            paraMode = int.from_bytes(self.extractICCtag(tag)[8:10], 'big')
-            if paraMode == 0:
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[12:16]))
-            elif paraMode == 1:
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[12:16]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[16:20]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[20:24]))
-            elif paraMode == 2:
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[12:16]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[16:20]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[20:24]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[24:28]))
-            elif paraMode == 3:
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[12:16]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[16:20]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[20:24]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[24:28]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[28:32]))
-            elif paraMode == 4:
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[12:16]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[16:20]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[20:24]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[24:28]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[28:32]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[32:36]))
-                paraParams.append(self.s15Fixed16NumberToFloat(self.extractICCtag(tag)[36:40]))
-        else:
-            paraMode = 0
+        if self.findTagType(tag) == 'para':
+            paraParams = self.parametricParseSA(self.extractICCtag(tag))
         
         return paraParams
 
@@ -806,38 +2215,20 @@ class iccToTRC:
     # Standalone
     #
     def parametricParseSA(self, byteIn) -> list:
-        paraParams = []
+        # parameter count of each parametric function type (0-4)
+        paraCounts = [1, 3, 4, 5, 7]
 
         paraMode = int.from_bytes(byteIn[8:10], 'big')
-        if paraMode == 0:
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[12:16]))
-        elif paraMode == 1:
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[12:16]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[16:20]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[20:24]))
-        elif paraMode == 2:
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[12:16]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[16:20]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[20:24]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[24:28]))
-        elif paraMode == 3:
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[12:16]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[16:20]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[20:24]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[24:28]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[28:32]))
-        elif paraMode == 4:
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[12:16]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[16:20]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[20:24]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[24:28]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[28:32]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[32:36]))
-            paraParams.append(self.s15Fixed16NumberToFloat(byteIn[36:40]))
+        if paraMode >= len(paraCounts):
+            return []
+
+        paraParams = self.s15Fixed16ArrayToFloat(byteIn[12:12 + (paraCounts[paraMode] * 4)]).tolist()
         
         return paraParams
         
-    def profileFromEmbed(self, pName = '') -> colour.RGB_Colourspace:
+    def profileFromEmbed(self, pName = '') -> 'colour.RGB_Colourspace':
+        self.materialize()
+        import colour
 
         pRedPrimary = colour.XYZ_to_xy(self.primaries[0])
         pGreenPrimary = colour.XYZ_to_xy(self.primaries[1])
@@ -863,30 +2254,14 @@ class iccToTRC:
         else:
             self.prfPCS_white_check = True
 
-        if self.extractICCtag('chad') != -1:
-            chAD_mtx = self.extractSF32data('chad')
-            chad_exist = True
-        else:
-            chad_exist = False
-
         pcsWhite_XYZ = self.extractXYZPCS()
         wt_pcs = colour.XYZ_to_xy(pcsWhite_XYZ)
-        pWhite_XYZ = self.extractXYZdata('wtpt')
-
-        sinMTX = np.array([[1,0,0],[0,1,0],[0,0,1]], dtype=float)
-
-        if chad_exist and not np.all(chAD_mtx == sinMTX):
-            # use chromatic_adaptation tag if the profile has it
-            # ignore if chromatic adaptation matrix is identity
-            pCAinv = inv(chAD_mtx)
-            pWhiteCA = np.dot(pCAinv, pcsWhite_XYZ)
-            pWhitexy = colour.XYZ_to_xy(pWhiteCA)
-            wt_prf = pWhitexy
-            self.prfWhiteXYZ = pWhiteCA
-        else:
-            # else, take from the media_white_point tag
-            wt_prf = colour.XYZ_to_xy(pWhite_XYZ)
-            self.prfWhiteXYZ = pWhite_XYZ
+
+        pWhite_XYZ = self.mediaWhite()
+        if pWhite_XYZ is None:
+            raise Exception('No media white point found')
+        wt_prf = colour.XYZ_to_xy(pWhite_XYZ)
+        self.prfWhiteXYZ = pWhite_XYZ
 
         if pName:
             p_Name = pName
@@ -911,6 +2286,87 @@ class iccToTRC:
 
         return colourspace
 
+    def mediaWhite(self):
+        # media white XYZ, from the chromatic_adaptation tag if the profile has one that
+        # is not identity (undone on the PCS white), else from the media_white_point tag,
+        # None without either
+        if self.findTagPos('chad') != -1:
+            chAD_mtx = self.extractSF32data('chad')
+            if not np.all(chAD_mtx == np.eye(3)):
+                return np.dot(inv(chAD_mtx), self.extractXYZPCS())
+
+        if self.findTagPos('wtpt') != -1:
+            return self.extractXYZdata('wtpt')
+
+        return None
+
+    def adaptedChromaticities(self, primaries):
+        # (primariesCA, white xy) as profileFromEmbed computes them, but without colour:
+        # the colorant XYZ rows Bradford adapted from the PCS white to the media white,
+        # None for a profile without a media white
+        whiteXYZ = self.mediaWhite()
+        if whiteXYZ is None or np.sum(whiteXYZ) <= 0:
+            return None
+
+        def XYZToxy(XYZ):
+            total = np.sum(XYZ, axis=-1, keepdims=True)
+            return XYZ[..., :2] / np.where(total == 0, 1, total)
+
+        pcsWhite = self.extractXYZPCS()
+        white = XYZToxy(np.asarray(whiteXYZ, dtype=float))
+
+        # same as colour.chromatically_adapted_primaries, whites normalised to Y = 1
+        xy = XYZToxy(np.asarray(primaries, dtype=float))
+        xy = np.where(xy == 0, 0.0000001, xy)
+        XYZ = np.column_stack([xy[:, 0] / xy[:, 1], np.ones(3), (1 - xy[:, 0] - xy[:, 1]) / xy[:, 1]])
+        adapted = XYZ @ self.bradford(pcsWhite / pcsWhite[1], whiteXYZ / whiteXYZ[1]).T
+
+        return XYZToxy(adapted), white
+
+    def primariesFromTags(self):
+        # colorant XYZ rows read from the tags alone, like constructGeneric finds them but
+        # without building any curve or CLUT: the colorant tags of matrix/TRC profiles,
+        # the mAB matrix (else the colorant tags) and the mft2 CLUT corners. None if the
+        # profile has neither.
+        def colorantTags():
+            if any(self.findTagPos(x) == -1 for x in ('rXYZ', 'gXYZ', 'bXYZ')):
+                return None
+            return np.array([self.extractXYZdata(x) for x in ('rXYZ', 'gXYZ', 'bXYZ')])
+
+        if self.prfType == 'std':
+            return self.primaries
+        if self.prfType not in ('mab', 'mft2'):
+            return None
+
+        a2b0_buf = self.extractICCtag('A2B0')
+        if a2b0_buf[8] != 3 or a2b0_buf[9] != 3:
+            return None
+
+        if self.prfType == 'mab':
+            a2b0_matpos = int.from_bytes(a2b0_buf[16:20], 'big')
+            if not a2b0_matpos:
+                return colorantTags()
+            m = self.s15Fixed16ArrayToFloat(a2b0_buf[a2b0_matpos:a2b0_matpos+36])
+            return np.array([[m[0], m[3], m[6]], [m[1], m[4], m[7]], [m[2], m[5], m[8]]])
+
+        # mft2, the CLUT output at the pure red, green and blue input corners
+        gridPoints = int(a2b0_buf[10])
+        inTabLen = int.from_bytes(a2b0_buf[48:50], 'big')
+        clutPos = 52 + inTabLen * 2 * 3
+        corners = [(gridPoints - 1) * gridPoints * gridPoints, (gridPoints - 1) * gridPoints, gridPoints - 1]
+        return np.array([np.frombuffer(a2b0_buf, dtype='>u2', count=3, offset=clutPos + x * 6) / 65535 for x in corners])
+
+    def tagCurveToLinear(self, tag: str, input):
+        # one curv / para TRC tag evaluated straight from the profile bytes, nothing kept
+        entry = self.extractICCtag(tag)
+        if self.tagTypeSA(entry) == 'para':
+            return self.trcParaToLinearSingle(input, *self.parametricParseSA(entry))
+
+        if int.from_bytes(entry[8:12], 'big') == 1:
+            return self.trcParaToLinearSingle(input, self.u8Fixed8NumberToFloat(entry[12:14]))
+        table = self.curvModeGetTableSA(entry)
+        return np.interp(input, table[0], table[1])
+
     def u8Fixed8NumberToFloat(self, u: bytes) -> float:
         t = struct.unpack('>H', u)
         g = (2**-8) * t[0]
@@ -926,123 +2382,118 @@ class iccToTRC:
         g = (2**-16) * t[0]
         return g
 
+    def s15Fixed16ArrayToFloat(self, s: bytes) -> np.ndarray:
+        t = np.frombuffer(s, dtype='>i4', count=len(s) // 4)
+        g = (2**-16) * t
+        return g
+
+    def tagTypeSA(self, tagBuffer) -> str:
+        return bytes(tagBuffer[0:4]).decode('latin-1').strip()
+
     def extractSF32data(self, sf32Tag):
 
         tagBuffer = self.extractICCtag(sf32Tag)
-        tagType = tagBuffer[0:4].decode().strip()
+        tagType = self.tagTypeSA(tagBuffer)
 
         if tagType != 'sf32':
             raise Exception('Selected tag is not sf32')
             # return 0
 
-        sf32arr = np.array(
-            [
-                [
-                    self.s15Fixed16NumberToFloat(tagBuffer[8:12]),
-                    self.s15Fixed16NumberToFloat(tagBuffer[12:16]),
-                    self.s15Fixed16NumberToFloat(tagBuffer[16:20])
-                ],
-                [
-                    self.s15Fixed16NumberToFloat(tagBuffer[20:24]),
-                    self.s15Fixed16NumberToFloat(tagBuffer[24:28]),
-                    self.s15Fixed16NumberToFloat(tagBuffer[28:32])
-                ],
-                [
-                    self.s15Fixed16NumberToFloat(tagBuffer[32:36]),
-                    self.s15Fixed16NumberToFloat(tagBuffer[36:40]),
-                    self.s15Fixed16NumberToFloat(tagBuffer[40:44])
-                ],
-            ])
+        sf32arr = self.s15Fixed16ArrayToFloat(tagBuffer[8:44]).reshape(3, 3)
 
         return sf32arr
 
     def extractXYZPCS(self):
 
-        arrXYZ = np.array([
-            self.s15Fixed16NumberToFloat(self.prfByte[68:72]),
-            self.s15Fixed16NumberToFloat(self.prfByte[72:76]),
-            self.s15Fixed16NumberToFloat(self.prfByte[76:80])
-        ])
+        arrXYZ = self.s15Fixed16ArrayToFloat(self.prfByte[68:80])
 
         return arrXYZ
 
     def extractXYZdata(self, xyzTag):
 
         tagBuffer = self.extractICCtag(xyzTag)
-        tagType = tagBuffer[0:4].decode().strip()
+        tagType = self.tagTypeSA(tagBuffer)
 
         if tagType != 'XYZ':
             raise Exception('Selected tag is not XYZ')
             # return 0
 
-        arrXYZ = np.array([
-            self.s15Fixed16NumberToFloat(tagBuffer[8:12]),
-            self.s15Fixed16NumberToFloat(tagBuffer[12:16]),
-            self.s15Fixed16NumberToFloat(tagBuffer[16:20])
-        ])
+        arrXYZ = self.s15Fixed16ArrayToFloat(tagBuffer[8:20])
 
         return arrXYZ
 
-    def extractICCtag(self, byteToFind) -> bytes:
+    def parseTagDirectory(self) -> dict:
 
-        # only search in tag fields after the header
+        # tag table right after the 128 byte header, 12 bytes per entry:
+        # signature, offset, size
         tagCount = int.from_bytes(self.prfByte[128:132], 'big')
-        tagCountLen = tagCount * 12
-        tagBuffer = self.prfByte[132:132+tagCountLen]
+        tagTable = np.frombuffer(
+            self.prfByte, 
+            dtype=[('sig', 'S4'), ('pos', '>u4'), ('len', '>u4')], 
+            count=tagCount, 
+            offset=132
+        )
+
+        tagDir = {}
+        for sig, tagPos, tagLen in tagTable.tolist():
+            # first entry wins if a signature is listed twice
+            tagDir.setdefault(
+                sig.decode('latin-1'), 
+                (tagPos, tagLen, self.tagTypeSA(self.prfByte[tagPos:tagPos+4]))
+            )
+
+        return tagDir
+
+    def extractICCtag(self, byteToFind) -> bytes:
 
-        tagNdx = tagBuffer.find(byteToFind.encode('utf-8'))
+        tagEntry = self.tagDir.get(byteToFind)
 
         # terminate if no tag is found
-        if tagNdx == -1:
+        if tagEntry is None:
             # raise Exception('Cannot find selected tag in tags list')
             return -1
 
-        tagPosNdx = int.from_bytes(tagBuffer[tagNdx+4:tagNdx+8], 'big')
-        tagLen = int.from_bytes(tagBuffer[tagNdx+8:tagNdx+12], 'big')
-
-        # Deprecated
-        # tagNdx = self.prfByte.find(byteToFind.encode('utf-8'))
-        # tagPosNdx = int.from_bytes(self.prfByte[tagNdx+4:tagNdx+8], 'big')
-        # tagLen = int.from_bytes(self.prfByte[tagNdx+8:tagNdx+12], 'big')
-
+        tagPosNdx, tagLen, _ = tagEntry
         tagContent = self.prfByte[tagPosNdx:tagPosNdx+tagLen]
 
         return tagContent
 
     def findTagPos(self, byteToFind) -> int:
 
-        # only search in tag fields after the header
-        tagCount = int.from_bytes(self.prfByte[128:132], 'big')
-        tagCountLen = tagCount * 12
-        tagBuffer = self.prfByte[132:132+tagCountLen]
-
-        tagNdx = tagBuffer.find(byteToFind.encode('utf-8'))
+        tagEntry = self.tagDir.get(byteToFind)
 
         # terminate if no tag is found
-        if tagNdx == -1:
+        if tagEntry is None:
             # raise  Exception('Cannot find selected tag in tags list')
             return -1
 
-        tagPosNdx = int.from_bytes(tagBuffer[tagNdx+4:tagNdx+8], 'big')
+        return tagEntry[0]
+
+    def findTagType(self, byteToFind) -> str:
+
+        tagEntry = self.tagDir.get(byteToFind)
+
+        if tagEntry is None:
+            return ''
 
-        return tagPosNdx
+        return tagEntry[2]
 
     def extractDescription(self, descTag = 'desc') -> str:
 
         tagBuffer = self.extractICCtag(descTag)
-        tagType = tagBuffer[0:4].decode().strip()
+        tagType = self.tagTypeSA(tagBuffer)
 
         if tagType == 'desc':
             firstNdx = 12
-            lastNdx = tagBuffer[firstNdx:].find(b'\x00') + firstNdx
-            descStr = tagBuffer[firstNdx:lastNdx].decode('utf-8').replace('\x00','').strip()
+            lastNdx = bytes(tagBuffer[firstNdx:]).find(b'\x00') + firstNdx
+            descStr = bytes(tagBuffer[firstNdx:lastNdx]).decode('utf-8').replace('\x00','').strip()
 
             return descStr
 
         elif tagType == 'mluc':
             strLen = int.from_bytes(tagBuffer[20:24], 'big')
             strfirstNdx = int.from_bytes(tagBuffer[24:28], 'big')
-            descStr = tagBuffer[strfirstNdx:strfirstNdx+strLen].decode('utf-8').replace('\x00','').strip()
+            descStr = bytes(tagBuffer[strfirstNdx:strfirstNdx+strLen]).decode('utf-8').replace('\x00','').strip()
 
             return descStr
 
@@ -1060,20 +2511,28 @@ class iccToTRC:
         return tagversionICC
 
     def extractColorSpace(self) -> str:
-        strSpace = self.prfByte[16:20].decode('utf-8').strip()
+        strSpace = bytes(self.prfByte[16:20]).decode('utf-8').strip()
         return strSpace
 
-    def validate(self):
-        headerTag = self.prfByte[36:40].decode('utf-8').strip()
+    def validateHeader(self):
+        # header fields and tag table bounds, checked before the tag table is parsed
+        headerTag = bytes(self.prfByte[36:40]).decode('latin-1').strip()
         
         if headerTag != 'acsp':
             raise Exception(f'Identifier "{headerTag}" is not a valid ICC profile.')
             # return False
 
-        PCStag = self.prfByte[20:24].decode('utf-8').strip()
+        PCStag = bytes(self.prfByte[20:24]).decode('latin-1').strip()
         if PCStag != 'XYZ':
             raise Exception(f'PCS is {PCStag}, only XYZ is allowed')
 
+        tagCount = int.from_bytes(self.prfByte[128:132], 'big')
+        if len(self.prfByte) < 132 or 132 + tagCount * 12 > len(self.prfByte):
+            raise Exception(f'Tag table of {tagCount} entries does not fit in the {len(self.prfByte)} byte profile.')
+
+    def validate(self):
+        self.validateHeader()
+
         testEntries = np.array([
             self.findTagPos('rXYZ'),
             self.findTagPos('gXYZ'),
@@ -1088,3 +2547,517 @@ class iccToTRC:
             return False
         else:
             return True
+
+
+#
+# In-process registry of constructed transforms, keyed by the profile content digest
+# and the construction options. Least recently used entries are evicted once either
+# the entry count or the approximate compiled size goes over its bound.
+#
+class iccRegistry:
+    def __init__(self, maxEntries: int = 32, maxBytes: int = 256 * 1024 * 1024):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+
+        self.entries = OrderedDict()
+        self.entrySizes = {}
+        self.totalBytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.lock = threading.Lock()
+
+    def get(self, profile: bytes, **kwargs) -> iccToTRC:
+        # the shared instance keeps a view of its profile, so it gets an immutable snapshot:
+        # the caller's buffer may be changed or resized once this returns
+        if not isinstance(profile, bytes):
+            profile = bytes(profile)
+        key = (iccToTRC.profileDigest(profile), tuple(sorted(kwargs.items())))
+
+        with self.lock:
+            prf = self.entries.get(key)
+            if prf is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return prf
+            self.misses += 1
+
+        # construct outside the lock, a profile that fails to parse is not cached
+        prf = iccToTRC(profile, **kwargs)
+
+        with self.lock:
+            if key in self.entries:
+                # another thread got there first, keep a single shared instance
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+            self.entries[key] = prf
+            self.entrySizes[key] = prf.compiledSize()
+            self.totalBytes += self.entrySizes[key]
+            self.evict()
+
+        return prf
+
+    def evict(self):
+        # always keep the most recent entry, even if it is over the size bound alone
+        while len(self.entries) > 1 and (len(self.entries) > self.maxEntries or self.totalBytes > self.maxBytes):
+            key, _ = self.entries.popitem(last=False)
+            self.totalBytes -= self.entrySizes.pop(key)
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.entrySizes.clear()
+            self.totalBytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.totalBytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+prfRegistry = iccRegistry()
+
+
+#
+# Streaming 2D chromaticity histogram
+#
+# Accumulates decoded xy / u'v' coordinates tile by tile into a fixed grid of bins,
+# so the plotted data stays the size of the grid whatever the image size. Instances
+# only hold plain arrays, so worker results can be pickled back and merged.
+#
+class iccChromaHistogram:
+    # default plotted area of each diagram, (x min, x max, y min, y max)
+    defaultExtents = {'xy': (0.0, 0.8, 0.0, 0.9), 'uv': (0.0, 0.65, 0.0, 0.65)}
+
+    def __init__(self, space: str = 'xy', bins = 512, extent = None):
+        if space not in self.defaultExtents:
+            raise Exception(f'Chromaticity space {space} is not supported')
+
+        self.space = space
+        self.bins = (bins, bins) if np.ndim(bins) == 0 else tuple(bins)
+        self.extent = tuple(extent) if extent is not None else self.defaultExtents[space]
+
+        # counts[i, j]: i along x (or u'), j along y (or v')
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        # pixels that fell outside the extent or had no chromaticity (NaN)
+        self.outside = 0
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum()) + self.outside
+
+    def update(self, coords, weights = None):
+        # coords: (..., 2) chromaticity coordinates of one tile
+        # weights: optional pixel count per coordinate, see iccToTRC.trcDecodeUnique
+        coords = np.asarray(coords).reshape(-1, 2)
+        weights = np.ones(coords.shape[0], dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64).reshape(-1)
+        nx, ny = self.bins
+        x0, x1, y0, y1 = self.extent
+
+        ix = np.floor((coords[:, 0] - x0) * (nx / (x1 - x0)))
+        iy = np.floor((coords[:, 1] - y0) * (ny / (y1 - y0)))
+
+        # NaN compares false, so it lands outside as well
+        inside = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+        flat = ix[inside].astype(np.intp) * ny + iy[inside].astype(np.intp)
+
+        binned = np.bincount(flat, weights[inside], minlength=nx * ny)
+        self.counts += binned.astype(np.int64).reshape(self.bins)
+        self.outside += int(weights.sum() - weights[inside].sum())
+
+        return self
+
+    def accumulate(self, prf: iccToTRC, input, tileRows: int = 0):
+        # decode and bin row tiles of an image, only a tile of coordinates is ever held
+        input = np.asarray(input)
+        tileRows = tileRows if tileRows > 0 else prf.autoTileRows(input)
+
+        for x in range(0, input.shape[0], tileRows):
+            self.update(prf.trcDecodeChromaticity(input[x:x+tileRows], self.space))
+
+        return self
+
+    def compatible(self, other) -> bool:
+        return self.space == other.space and self.bins == other.bins and self.extent == other.extent
+
+    def merge(self, other):
+        if not self.compatible(other):
+            raise Exception('Histograms with different space, bins or extent cannot be merged')
+
+        self.counts += other.counts
+        self.outside += other.outside
+
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def density(self, normalise: str = 'max') -> np.ndarray:
+        # normalise: 'max' peaks at 1.0, 'sum' sums to 1.0 over the binned pixels
+        if normalise not in ('max', 'sum'):
+            raise Exception(f'Density normalisation {normalise} is not supported')
+
+        scale = self.counts.max() if normalise == 'max' else self.counts.sum()
+        return self.counts / scale if scale > 0 else np.zeros(self.bins, dtype=float)
+
+    def binEdges(self):
+        x0, x1, y0, y1 = self.extent
+        return np.linspace(x0, x1, self.bins[0] + 1), np.linspace(y0, y1, self.bins[1] + 1)
+
+    def binCentres(self):
+        xEdge, yEdge = self.binEdges()
+        return (xEdge[:-1] + xEdge[1:]) / 2, (yEdge[:-1] + yEdge[1:]) / 2
+
+    def points(self):
+        # occupied bins only, (n, 2) bin centre coordinates and their (n,) counts
+        i, j = np.nonzero(self.counts)
+        xCentre, yCentre = self.binCentres()
+        return np.stack([xCentre[i], yCentre[j]], axis=-1), self.counts[i, j]
+
+
+#
+# Gamut coverage statistics
+#
+# Chromaticities are tested against any number of reference gamut triangles in one
+# vectorized pass. Like iccChromaHistogram it accumulates tile by tile and merges
+# across workers. xy to u'v' is a projective map, so triangles stay triangles and the
+# same test works in either space.
+#
+class iccGamutCoverage:
+    # xy primaries (R, G, B), names as used by the plotter overlays
+    referencePrimaries = {
+        'sRGB': ((0.64, 0.33), (0.30, 0.60), (0.15, 0.06)),
+        'Adobe RGB (1998)': ((0.64, 0.33), (0.21, 0.71), (0.15, 0.06)),
+        'Display P3': ((0.680, 0.320), (0.265, 0.690), (0.150, 0.060)),
+        'ITU-R BT.2020': ((0.708, 0.292), (0.170, 0.797), (0.131, 0.046)),
+    }
+    chunkLen = 65536
+    # points this close to a gamut edge count as inside. Only absorbs rounding: the exact
+    # reference primaries come out of a float32 decode a few 1e-8 off their own edges
+    # (about 1e-17 in float64), a profile whose colorants really differ is still outside.
+    insideTolerance = 1e-6
+
+    def __init__(self, gamuts = ('sRGB', 'Display P3', 'ITU-R BT.2020'), space: str = 'xy'):
+        # gamuts: reference names, or a dict of name -> (3, 2) xy primaries
+        if space not in ('xy', 'uv'):
+            raise Exception(f'Chromaticity space {space} is not supported')
+
+        if not isinstance(gamuts, dict):
+            for x in gamuts:
+                if x not in self.referencePrimaries:
+                    raise Exception(f'Unknown reference gamut {x}')
+            gamuts = {x: self.referencePrimaries[x] for x in gamuts}
+
+        self.space = space
+        self.names = list(gamuts)
+        self.triangles = np.array([self.xyToSpace(np.reshape(gamuts[x], (3, 2))) for x in self.names], dtype=float)
+        self.winding = np.array([np.sign(self.signedArea(x)) for x in self.triangles])
+
+        # accumulators, per gamut
+        self.pixels = 0
+        self.undefined = 0
+        self.outside = np.zeros(len(self.names), dtype=np.int64)
+        self.outsideSum = np.zeros(len(self.names), dtype=float)
+        self.outsideMax = np.zeros(len(self.names), dtype=float)
+
+    def xyToSpace(self, xy):
+        if self.space == 'xy':
+            return np.asarray(xy, dtype=float)
+        x, y = xy[..., 0], xy[..., 1]
+        den = -2 * x + 12 * y + 3
+        return np.stack([4 * x / den, 9 * y / den], axis=-1)
+
+    def test(self, coords):
+        # coords: (..., 2), returns (gamuts, ...) inside masks and distances outside (0 inside)
+        coords = np.asarray(coords)
+        flat = coords.reshape(-1, 2)
+
+        inside = np.empty((len(self.names), flat.shape[0]), dtype=bool)
+        distance = np.empty((len(self.names), flat.shape[0]), dtype=float)
+
+        for x in range(0, flat.shape[0], self.chunkLen):
+            inside[:, x:x+self.chunkLen], distance[:, x:x+self.chunkLen] = self.testChunk(flat[x:x+self.chunkLen])
+
+        shape = (len(self.names),) + coords.shape[:-1]
+        return inside.reshape(shape), distance.reshape(shape)
+
+    def testChunk(self, chunk):
+        # vertices and edges (gamuts, 3 edges, 1, 2) against points (1, 1, n, 2)
+        vert = self.triangles[:, :, None, :]
+        edge = np.roll(self.triangles, -1, axis=1)[:, :, None, :] - vert
+        rel = chunk[None, None, :, :] - vert
+
+        # the sign of each edge cross product, oriented by the triangle winding
+        cross = edge[..., 0] * rel[..., 1] - edge[..., 1] * rel[..., 0]
+        inside = np.all(cross * self.winding[:, None, None] >= 0, axis=1)
+
+        # euclidean distance to the nearest edge segment
+        t = np.clip(np.sum(rel * edge, axis=-1) / np.sum(edge * edge, axis=-1), 0, 1)
+        near = rel - t[..., None] * edge
+        distance = np.sqrt(np.min(np.sum(near * near, axis=-1), axis=1))
+        inside |= distance <= self.insideTolerance
+        distance[inside] = 0
+
+        return inside, distance
+
+    def update(self, coords, weights = None):
+        # coords: (..., 2) chromaticities of one tile, weights: optional pixel counts
+        # black (0, 0) and NaN coordinates have no chromaticity and are only counted
+        coords = np.asarray(coords).reshape(-1, 2)
+        weights = np.ones(coords.shape[0], dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64).reshape(-1)
+
+        valid = np.all(np.isfinite(coords), axis=-1) & np.any(coords != 0, axis=-1)
+        coords, validWeights = coords[valid], weights[valid]
+
+        inside, distance = self.test(coords)
+
+        self.pixels += int(weights.sum())
+        self.undefined += int(weights.sum() - validWeights.sum())
+        self.outside += np.sum(~inside * validWeights, axis=-1)
+        self.outsideSum += np.sum(distance * validWeights, axis=-1)
+        if coords.shape[0]:
+            self.outsideMax = np.maximum(self.outsideMax, distance.max(axis=-1))
+
+        return self
+
+    def accumulate(self, prf: iccToTRC, input, tileRows: int = 0):
+        input = np.asarray(input)
+        tileRows = tileRows if tileRows > 0 else prf.autoTileRows(input)
+
+        for x in range(0, input.shape[0], tileRows):
+            self.update(prf.trcDecodeChromaticity(input[x:x+tileRows], self.space))
+
+        return self
+
+    def merge(self, other):
+        if self.space != other.space or self.names != other.names or not np.array_equal(self.triangles, other.triangles):
+            raise Exception('Coverage with different space or gamuts cannot be merged')
+
+        self.pixels += other.pixels
+        self.undefined += other.undefined
+        self.outside += other.outside
+        self.outsideSum += other.outsideSum
+        self.outsideMax = np.maximum(self.outsideMax, other.outsideMax)
+
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def results(self) -> dict:
+        # per gamut, percentages are of the pixels that have a chromaticity
+        valid = self.pixels - self.undefined
+        results = {}
+        for x, name in enumerate(self.names):
+            outside = int(self.outside[x])
+            results[name] = {
+                'insidePercent': 100 * (valid - outside) / valid if valid else 0.0,
+                'outsidePercent': 100 * outside / valid if valid else 0.0,
+                'outsidePixels': outside,
+                'outsideMeanDistance': float(self.outsideSum[x] / outside) if outside else 0.0,
+                'outsideMaxDistance': float(self.outsideMax[x]),
+            }
+        return results
+
+    def profileCoverage(self, prf: iccToTRC) -> dict:
+        # area of each reference gamut covered by the profile primaries, and the
+        # share of the profile gamut inside it, both in percent
+        if prf.primariesCA is None:
+            prf.profileFromEmbed()
+        prfTriangle = self.xyToSpace(np.reshape(prf.primariesCA, (3, 2)))
+        prfArea = self.polygonArea(prfTriangle)
+
+        results = {}
+        for name, triangle in zip(self.names, self.triangles):
+            common = self.polygonArea(self.clipPolygon(prfTriangle, triangle))
+            results[name] = {
+                'coveragePercent': 100 * common / self.polygonArea(triangle),
+                'insidePercent': 100 * common / prfArea if prfArea else 0.0,
+            }
+        return results
+
+    @staticmethod
+    def polygonArea(poly) -> float:
+        return abs(iccGamutCoverage.signedArea(poly)) if len(poly) >= 3 else 0.0
+
+    @staticmethod
+    def clipPolygon(poly, clip):
+        # Sutherland-Hodgman, clip is a convex polygon
+        poly = [np.asarray(x, dtype=float) for x in poly]
+        clip = np.asarray(clip, dtype=float)
+        if iccGamutCoverage.signedArea(clip) < 0:
+            clip = clip[::-1]
+
+        def side(p, a, b):
+            return (b[0] - a[0]) * (p[1] - a[1]) - (b[1] - a[1]) * (p[0] - a[0])
+
+        for x in range(len(clip)):
+            a, b = clip[x], clip[(x + 1) % len(clip)]
+            src, poly = poly, []
+            for y in range(len(src)):
+                p, q = src[y], src[(y + 1) % len(src)]
+                sp, sq = side(p, a, b), side(q, a, b)
+                if sp >= 0:
+                    poly.append(p)
+                if (sp >= 0) != (sq >= 0):
+                    poly.append(p + (q - p) * (sp / (sp - sq)))
+            if not poly:
+                break
+
+        return np.array(poly).reshape(-1, 2)
+
+    @staticmethod
+    def signedArea(poly) -> float:
+        x, y = poly[:, 0], poly[:, 1]
+        return float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+
+#
+# Parallel decode over a persistent process pool
+#
+# Input and output pixels live in shared memory, workers only receive the block names
+# and their row range. The profile reaches the workers as a compiled artifact
+# (see iccToTRC.saveCompiled) written once per pool, each worker loads it once.
+#
+class iccDecodePool:
+    # below this many pixels the decode runs in the calling process
+    minPixels = 1 << 18
+    # row blocks per worker, for load balancing
+    blocksPerWorker = 4
+
+    defaultPool = None
+    defaultLock = threading.Lock()
+
+    def __init__(self, workers: int = 0, cacheDir: str = ''):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+
+        self.ownCacheDir = not cacheDir
+        self.cacheDir = cacheDir if cacheDir else tempfile.mkdtemp(prefix='icctrc-')
+        # artifact paths already written, named by profile digest and options
+        self.artifacts = set()
+
+        import concurrent.futures
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+
+    @classmethod
+    def default(cls):
+        with cls.defaultLock:
+            if cls.defaultPool is None:
+                cls.defaultPool = cls()
+                # workers and the temporary artifact directory go away with the process
+                atexit.register(cls.closeDefault)
+            return cls.defaultPool
+
+    @classmethod
+    def closeDefault(cls):
+        with cls.defaultLock:
+            if cls.defaultPool is not None:
+                cls.defaultPool.close()
+                cls.defaultPool = None
+
+    def artifactPath(self, prf: iccToTRC) -> str:
+        # same profile and options, same artifact, the pool holds no reference to prf
+        # an artifact left by an older format version is written again
+        path = iccToTRC.compiledPath(self.cacheDir, prf.prfByte, **prf.prfOptions)
+        if path not in self.artifacts:
+            if not iccToTRC.compiledValid(path):
+                prf.saveCompiled(path)
+            self.artifacts.add(path)
+
+        return path
+
+    def decode(self, prf: iccToTRC, input, out = None):
+        input = np.asarray(input)
+        outShape = input.shape[:-1] + (3,)
+
+        if out is None:
+            out = np.empty(outShape, dtype=prf.prfDtype)
+
+        if input.size // 3 < self.minPixels or input.shape[0] < 2:
+            return prf.trcDecodeTiled(input, out=out)
+
+        path = self.artifactPath(prf)
+
+        from multiprocessing import shared_memory
+        inShm = shared_memory.SharedMemory(create=True, size=max(1, input.nbytes))
+        outShm = shared_memory.SharedMemory(create=True, size=int(np.prod(outShape)) * prf.prfDtype.itemsize)
+        try:
+            inBuf = np.ndarray(input.shape, dtype=input.dtype, buffer=inShm.buf)
+            inBuf[...] = input
+            del inBuf
+
+            rows = input.shape[0]
+            blocks = min(rows, self.workers * self.blocksPerWorker)
+            bounds = np.linspace(0, rows, blocks + 1).astype(int)
+
+            tasks = [
+                self.executor.submit(
+                    decodePoolTask, path, 
+                    inShm.name, input.shape, input.dtype.str, 
+                    outShm.name, outShape, prf.prfDtype.str, 
+                    int(bounds[x]), int(bounds[x+1])
+                )
+                for x in range(blocks)
+            ]
+            for task in tasks:
+                task.result()
+
+            outBuf = np.ndarray(outShape, dtype=prf.prfDtype, buffer=outShm.buf)
+            out[...] = outBuf
+            del outBuf
+        finally:
+            inShm.close()
+            inShm.unlink()
+            outShm.close()
+            outShm.unlink()
+
+        return out
+
+    def close(self):
+        self.executor.shutdown()
+        self.artifacts.clear()
+
+        if self.ownCacheDir:
+            for f in os.listdir(self.cacheDir):
+                os.remove(os.path.join(self.cacheDir, f))
+            os.rmdir(self.cacheDir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# profiles already loaded by this worker process, keyed by artifact path
+decodePoolProfiles = {}
+
+def decodePoolTask(path, inName, inShape, inDtype, outName, outShape, outDtype, rowStart, rowEnd):
+    from multiprocessing import shared_memory
+
+    prf = decodePoolProfiles.get(path)
+    if prf is None:
+        prf = iccToTRC.fromCompiled(path)
+        decodePoolProfiles[path] = prf
+
+    inShm = shared_memory.SharedMemory(name=inName)
+    outShm = shared_memory.SharedMemory(name=outName)
+    try:
+        inBuf = np.ndarray(inShape, dtype=np.dtype(inDtype), buffer=inShm.buf)
+        outBuf = np.ndarray(outShape, dtype=np.dtype(outDtype), buffer=outShm.buf)
+
+        prf.trcDecodeTiled(inBuf[rowStart:rowEnd], out=outBuf[rowStart:rowEnd])
+
+        del inBuf, outBuf
+    finally:
+        inShm.close()
+        outShm.close()
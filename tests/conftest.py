@@ -0,0 +1,62 @@
+#
+# Tests run against the modules in src, on profiles built by iccProfileGen
+#
+#   python -m pytest tests
+#
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import iccProfileGen
+from icctotrcMP import iccToTRC
+
+synthKinds = ('curv-gamma', 'curv-table', 'para', 'sRGB', 'mAB', 'mft2', 'pq', 'hlg')
+
+
+@pytest.fixture(autouse=True)
+def freshKnown():
+    # every test starts without memoized well-known matches
+    iccToTRC.clearKnown()
+    yield
+    iccToTRC.clearKnown()
+
+
+@pytest.fixture(scope='session')
+def synthProfiles():
+    return {x: iccProfileGen.synthProfile(x) for x in synthKinds}
+
+
+@pytest.fixture
+def pixels():
+    return np.random.default_rng(0).random((32, 24, 3))
+
+
+def mixedPQProfile() -> bytes:
+    # PQ curves, BT.2020 matrix and D65 white like the well-known BT.2100 PQ profile,
+    # but with a CLUT that mixes the channels
+    grid = np.linspace(0, 1, 17)
+    r, g, b = np.meshgrid(grid, grid, grid, indexing='ij')
+    table = np.clip(np.stack([r + 0.8 * g * b * (g - b), g, b], axis=-1), 0, 1)
+    aCurve = iccProfileGen.tagCurvTable(iccProfileGen.pqEOTF(np.linspace(0, 1, 4096)))
+    matrix = iccToTRC.knownColorants('ITU-R BT.2020').T
+    return iccProfileGen.a2b0Profile(iccProfileGen.tagMAB([aCurve] * 3, matrix=matrix, table=table), 'Mixed PQ')
+
+
+def d50SRGBProfile() -> bytes:
+    # sRGB colorants and transfer, but a D50 media white and no chad tag
+    g = iccProfileGen
+    return g.buildProfile([
+        ('desc', g.tagDesc('D50 sRGB')),
+        ('wtpt', g.tagXYZ(g.whiteD50)),
+        ('rXYZ', g.tagXYZ(g.sRGBColorants[0])),
+        ('gXYZ', g.tagXYZ(g.sRGBColorants[1])),
+        ('bXYZ', g.tagXYZ(g.sRGBColorants[2])),
+        ('rTRC', g.tagPara(3, g.sRGBPara)),
+        ('gTRC', g.tagPara(3, g.sRGBPara)),
+        ('bTRC', g.tagPara(3, g.sRGBPara)),
+    ])
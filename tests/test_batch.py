@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import CIEBatch
+from icctotrcMP import iccToTRC, iccGamutCoverage
+
+primaryPixels = np.array([[[255, 0, 0], [0, 255, 0], [0, 0, 255], [255, 255, 255], [255, 255, 0], [0, 255, 255]]], dtype=np.uint8)
+
+
+def batchOptions(**kwargs):
+    options = {
+        'rootDir': '', 'space': 'xy', 'gamuts': ['sRGB', 'Display P3'], 'maxPixels': 0,
+        'precision': 'float32', 'histogramDir': '', 'bins': 64,
+    }
+    options.update(kwargs)
+    return options
+
+
+@pytest.mark.parametrize('precision', ['float32', 'float64'])
+@pytest.mark.parametrize('space', ['xy', 'uv'])
+def test_untaggedIsReferenceSRGB(precision, space):
+    # the sRGB primaries and secondaries of an untagged image are all inside sRGB
+    result = CIEBatch.analyseImage(primaryPixels, None, batchOptions(precision=precision, space=space))
+
+    assert result['profile'] == ''
+    assert result['knownProfile'] == 'sRGB'
+    assert np.allclose(result['primaries'], iccGamutCoverage.referencePrimaries['sRGB'], rtol=0, atol=1e-12)
+    assert np.allclose(result['whitepoint'], iccToTRC.knownWhite, rtol=0, atol=1e-12)
+    assert result['gamut']['sRGB']['insidePercent'] == 100
+    assert result['profileCoverage']['sRGB']['coveragePercent'] == pytest.approx(100)
+    assert result['gamut']['Display P3']['insidePercent'] == 100
+
+
+def test_referenceMatchesColour(pixels):
+    colour = pytest.importorskip('colour')
+    prf = iccToTRC.fromReference('sRGB')
+
+    assert np.allclose(prf.trcDecode(pixels), colour.cctf_decoding(pixels, function='sRGB'), rtol=0, atol=1e-12)
+    assert np.allclose(prf.rgbToXYZMatrix(), colour.models.RGB_COLOURSPACE_sRGB.matrix_RGB_to_XYZ, rtol=0, atol=1e-4)
+
+
+def test_taggedProfile(synthProfiles):
+    result = CIEBatch.analyseImage(primaryPixels, synthProfiles['pq'], batchOptions(gamuts=['ITU-R BT.2020']))
+
+    assert result['profileType'] == 'mab'
+    assert result['knownProfile'] == 'ITU-R BT.2100 PQ'
+    assert result['gamut']['ITU-R BT.2020']['insidePercent'] == 100
+
+    row = CIEBatch.csvRow(dict(result, path='image.png', status='ok'), ['ITU-R BT.2020'])
+    assert row['ITU-R BT.2020 inside %'] == 100
+
+
+def test_edgeToleranceIsRoundingOnly():
+    # points on an edge up to float rounding away count as inside, a real 1e-5 miss does not
+    coverage = iccGamutCoverage(['sRGB'])
+    red, green = np.array(iccGamutCoverage.referencePrimaries['sRGB'][:2])
+    mid = (red + green) / 2
+    normal = np.array([green[1] - red[1], red[0] - green[0]])
+    normal /= np.linalg.norm(normal)
+
+    inside, distance = coverage.test(np.array([red, mid, mid + normal * 1e-8, mid + normal * 1e-5, mid - normal * 1e-5]))
+    outward = 3 if distance[0, 3] > 0 else 4
+
+    assert inside[0].tolist().count(False) == 1
+    assert not inside[0, outward]
+    assert distance[0, outward] == pytest.approx(1e-5, rel=1e-3)
+    assert iccGamutCoverage.insideTolerance < 1e-5
+
+
+def test_coverageMerge(pixels):
+    prf = iccToTRC.fromReference('sRGB')
+    whole = iccGamutCoverage(['Display P3']).accumulate(prf, pixels)
+    merged = iccGamutCoverage(['Display P3']).accumulate(prf, pixels[:10])
+    merged += iccGamutCoverage(['Display P3']).accumulate(prf, pixels[10:])
+
+    assert merged.results() == whole.results()
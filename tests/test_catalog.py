@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from icctotrcMP import iccToTRC
+from iccCatalog import iccCatalog, profileRecord
+
+from conftest import synthKinds
+
+
+@pytest.fixture
+def library(tmp_path, synthProfiles):
+    # two files with the same sRGB profile, a few others and one broken file
+    root = tmp_path / 'profiles'
+    root.mkdir()
+    for name, kind in (('a.icc', 'sRGB'), ('b.icc', 'sRGB'), ('c.icm', 'pq'), ('d.icc', 'mAB'), ('e.icc', 'para')):
+        (root / name).write_bytes(synthProfiles[kind])
+    (root / 'broken.icc').write_bytes(b'x' * 200)
+    return root
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    with iccCatalog(str(tmp_path / 'catalog.sqlite')) as catalog:
+        yield catalog
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+def test_recordBuildsNothing(synthProfiles, monkeypatch, kind):
+    # records come from the metadata and tags, the transform is never built
+    def noBuild(self):
+        raise AssertionError('materialize called')
+    monkeypatch.setattr(iccToTRC, 'materialize', noBuild)
+
+    record = profileRecord(synthProfiles[kind])
+    assert record['error'] == ''
+    assert record['colorSpace'] == 'RGB'
+    assert record['whiteX'] == pytest.approx(0.3127, abs=1e-4)
+    assert record['whiteY'] == pytest.approx(0.3290, abs=1e-4)
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+def test_recordPrimariesMatchEmbed(synthProfiles, kind):
+    record = profileRecord(synthProfiles[kind])
+    prf = iccToTRC(synthProfiles[kind], known=False)
+    prf.profileFromEmbed()
+
+    primaries = [record[x] for x in ('redX', 'redY', 'greenX', 'greenY', 'blueX', 'blueY')]
+    assert np.allclose(primaries, np.ravel(prf.primariesCA), rtol=0, atol=1e-12)
+
+
+def test_scanCounts(catalog, library):
+    counts = catalog.scan([str(library)], workers=1, log=lambda x: None)
+    assert counts['files'] == 6
+    assert counts['scanned'] == 6
+    # the shared sRGB profile is added once, the broken file is stored with its error
+    assert counts['added'] == 5
+    assert counts['failed'] == 1
+    assert catalog.summary()['profiles'] == 5
+
+    again = catalog.scan([str(library)], workers=1, log=lambda x: None)
+    assert again['unchanged'] == 6
+    assert again['scanned'] == 0
+    assert again['added'] == 0
+
+
+def test_scanOnlyNewFiles(catalog, library, synthProfiles):
+    catalog.scan([str(library)], workers=1, log=lambda x: None)
+    (library / 'f.icc').write_bytes(synthProfiles['sRGB'])
+    (library / 'g.icc').write_bytes(synthProfiles['mft2'])
+    (library / 'e.icc').unlink()
+
+    counts = catalog.scan([str(library)], workers=1, log=lambda x: None)
+    assert counts['scanned'] == 2
+    assert counts['added'] == 1
+    assert counts['removed'] == 1
+    assert catalog.summary()['files'] == 7
+
+
+def test_query(catalog, library):
+    catalog.scan([str(library)], workers=1, log=lambda x: None)
+
+    assert sorted(x['path'].rsplit('/', 1)[-1] for x in catalog.query(knownProfile='sRGB')) == ['a.icc', 'b.icc']
+    assert len(catalog.query(knownProfile='sRGB', byFile=False)) == 1
+    assert [x['path'].rsplit('/', 1)[-1] for x in catalog.query(primaries='ITU-R BT.2020')] == ['c.icm']
+    assert len(catalog.query(primaries='sRGB', trcType='para')) == 3
+    assert len(catalog.query(white=iccToTRC.knownWhite)) == 5
@@ -0,0 +1,121 @@
+import struct
+import warnings
+
+import numpy as np
+import pytest
+
+import iccProfileGen
+from icctotrcMP import iccToTRC, iccDecodePool, iccRegistry
+
+from conftest import synthKinds
+
+
+def markStale(path):
+    # pretend the artifact was written by an older format version
+    with open(path, 'r+b') as f:
+        f.seek(8)
+        f.write(struct.pack('<L', iccToTRC.compiledVersion - 1))
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+@pytest.mark.parametrize('options', [{}, {'known': False}, {'precision': 'float32'}])
+def test_compiledRoundTrip(synthProfiles, pixels, tmp_path, kind, options):
+    prf = iccToTRC(synthProfiles[kind], **options)
+    path = str(tmp_path / 'profile.icctrc')
+    prf.saveCompiled(path)
+
+    loaded = iccToTRC.fromCompiled(path, synthProfiles[kind])
+    assert iccToTRC.compiledValid(path)
+    assert loaded.prfKnown == prf.prfKnown
+    assert np.array_equal(loaded.trcDecode(pixels), prf.trcDecode(pixels))
+
+    encoded = np.round(pixels * 255).astype(np.uint8)
+    assert np.array_equal(loaded.trcDecodeInt(encoded), prf.trcDecodeInt(encoded))
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+def test_compiledPrimariesMatchEmbed(synthProfiles, tmp_path, kind):
+    # saveCompiled works out the primaries without colour, same values as profileFromEmbed
+    path = str(tmp_path / 'profile.icctrc')
+    iccToTRC(synthProfiles[kind]).saveCompiled(path)
+    loaded = iccToTRC.fromCompiled(path)
+
+    embed = iccToTRC(synthProfiles[kind])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        embed.profileFromEmbed()
+
+    assert np.allclose(loaded.primariesCA, embed.primariesCA, rtol=0, atol=1e-12)
+    assert np.allclose(loaded.prfWhite, embed.prfWhite, rtol=0, atol=1e-12)
+
+
+def test_compiledWithoutMediaWhite(tmp_path):
+    g = iccProfileGen
+    profile = g.buildProfile([('desc', g.tagDesc('No white')), ('A2B0', g.tagMAB([g.tagCurvGamma(2.2)] * 3))])
+    path = str(tmp_path / 'profile.icctrc')
+    iccToTRC(profile).saveCompiled(path)
+
+    assert iccToTRC.fromCompiled(path).primariesCA is None
+
+
+def test_compiledVersionMismatch(synthProfiles, tmp_path):
+    path = str(tmp_path / 'profile.icctrc')
+    iccToTRC(synthProfiles['mAB']).saveCompiled(path)
+    markStale(path)
+
+    assert not iccToTRC.compiledValid(path)
+    assert not iccToTRC.compiledValid(str(tmp_path / 'missing.icctrc'))
+    with pytest.raises(Exception, match='version'):
+        iccToTRC.fromCompiled(path)
+
+
+def test_compiledCacheRebuildsStale(synthProfiles, pixels, tmp_path):
+    cacheDir = str(tmp_path)
+    prf = iccToTRC.fromCompiledCache(synthProfiles['mAB'], cacheDir)
+    path = iccToTRC.compiledPath(cacheDir, synthProfiles['mAB'])
+    markStale(path)
+
+    rebuilt = iccToTRC.fromCompiledCache(synthProfiles['mAB'], cacheDir)
+    assert iccToTRC.compiledValid(path)
+    assert np.array_equal(rebuilt.trcDecode(pixels), prf.trcDecode(pixels))
+
+
+@pytest.fixture
+def decodePool(tmp_path):
+    pool = iccDecodePool(workers=2, cacheDir=str(tmp_path))
+    pool.minPixels = 1
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize('kind', ['sRGB', 'mAB', 'mft2'])
+def test_poolMatchesLocal(synthProfiles, decodePool, kind):
+    prf = iccToTRC(synthProfiles[kind])
+    image = np.random.default_rng(1).random((64, 48, 3))
+
+    assert np.array_equal(prf.trcDecodeParallel(image, decodePool), prf.trcDecode(image))
+
+
+def test_poolRewritesStaleArtifact(synthProfiles, decodePool):
+    prf = iccToTRC(synthProfiles['mAB'])
+    path = iccToTRC.compiledPath(decodePool.cacheDir, prf.prfByte, **prf.prfOptions)
+    prf.saveCompiled(path)
+    markStale(path)
+
+    image = np.random.default_rng(2).random((16, 16, 3))
+    assert np.array_equal(decodePool.decode(prf, image), prf.trcDecode(image))
+    assert iccToTRC.compiledValid(path)
+
+
+def test_registrySharesAndCopies(synthProfiles):
+    registry = iccRegistry(maxEntries=2)
+    buffer = bytearray(synthProfiles['para'])
+
+    prf = registry.get(buffer)
+    buffer[:] = b'\x00' * len(buffer)
+    assert bytes(prf.prfByte) == synthProfiles['para']
+
+    assert registry.get(synthProfiles['para']) is prf
+    assert registry.get(synthProfiles['para'], precision='float32') is not prf
+    registry.get(synthProfiles['mAB'])
+    assert registry.stats()['entries'] == 2
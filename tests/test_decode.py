@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+
+import iccProfileGen
+from icctotrcMP import iccToTRC, iccCLUT
+
+from conftest import synthKinds
+
+expectedKnown = {
+    'curv-gamma': '', 'curv-table': '', 'para': '', 'sRGB': 'sRGB',
+    'mAB': '', 'mft2': '', 'pq': 'ITU-R BT.2100 PQ', 'hlg': 'ITU-R BT.2100 HLG',
+}
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+def test_knownMatchesGeneric(synthProfiles, pixels, kind):
+    # the closed form fast path decodes like the generic tables it replaces
+    fast = iccToTRC(synthProfiles[kind])
+    generic = iccToTRC(synthProfiles[kind], known=False)
+
+    assert fast.prfKnown == expectedKnown[kind]
+    assert generic.prfKnown == ''
+    assert np.allclose(fast.trcDecode(pixels), generic.trcDecode(pixels), rtol=0, atol=2e-5)
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+@pytest.mark.parametrize('known', [True, False])
+def test_intLUTMatchesFloat(synthProfiles, pixels, kind, known):
+    prf = iccToTRC(synthProfiles[kind], known=known)
+    for dtype in (np.uint8, np.uint16):
+        levels = np.iinfo(dtype).max
+        encoded = np.round(pixels * levels).astype(dtype)
+        assert np.allclose(prf.trcDecodeInt(encoded), prf.trcDecode(encoded / levels), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+def test_tiledAndUniqueMatchWhole(synthProfiles, pixels, kind):
+    prf = iccToTRC(synthProfiles[kind], known=False)
+    whole = prf.trcDecode(pixels)
+
+    assert np.array_equal(prf.trcDecodeTiled(pixels, tileRows=5), whole)
+    tiles = np.concatenate([x[2] for x in prf.trcDecodeTiles(pixels, tileRows=7)])
+    assert np.array_equal(tiles, whole)
+
+    encoded = np.round(pixels * 255).astype(np.uint8)
+    assert np.array_equal(prf.trcDecodeUnique(encoded, scatter=True), prf.trcDecodeInt(encoded))
+    decoded, counts = prf.trcDecodeUnique(encoded)
+    assert counts.sum() == encoded.shape[0] * encoded.shape[1]
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+def test_float32MatchesFloat64(synthProfiles, pixels, kind):
+    prf64 = iccToTRC(synthProfiles[kind], known=False)
+    prf32 = iccToTRC(synthProfiles[kind], known=False, precision='float32')
+
+    decoded = prf32.trcDecode(pixels)
+    assert decoded.dtype == np.float32
+    assert np.allclose(decoded, prf64.trcDecode(pixels), rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+def test_lazyBuildsOnFirstDecode(synthProfiles, pixels, kind):
+    prf = iccToTRC(synthProfiles[kind], lazy=True)
+    assert not prf.isMaterialized
+    assert prf.prfType in ('std', 'mab', 'mft2')
+    with pytest.raises(AttributeError):
+        prf.uniformTRC
+
+    decoded = prf.trcDecode(pixels)
+    assert prf.isMaterialized
+    assert np.array_equal(decoded, iccToTRC(synthProfiles[kind]).trcDecode(pixels))
+
+
+@pytest.mark.parametrize('kind', ['curv-gamma', 'para', 'sRGB'])
+def test_encodeInvertsDecode(synthProfiles, pixels, kind):
+    prf = iccToTRC(synthProfiles[kind])
+    assert np.allclose(prf.trcEncode(prf.trcDecode(pixels)), pixels, rtol=0, atol=1e-9)
+
+
+def test_paraLUTFollowsParaCurve(synthProfiles, pixels):
+    exact = iccToTRC(synthProfiles['para'], known=False)
+    table = iccToTRC(synthProfiles['para'], known=False, paraLUT=True)
+    assert np.allclose(table.trcDecode(pixels), exact.trcDecode(pixels), rtol=0, atol=1e-3)
+
+
+def test_knownOptOutSkipsMemo(synthProfiles):
+    iccToTRC(synthProfiles['sRGB'], known=False)
+    assert len(iccToTRC.knownDigests) == 0
+
+    assert iccToTRC(synthProfiles['sRGB'], paraLUT=True).prfKnown == 'sRGB'
+    assert len(iccToTRC.knownDigests) == 1
+
+
+@pytest.mark.parametrize('kind', ['mAB', 'pq'])
+def test_trilinearCloseToTetrahedral(synthProfiles, pixels, kind):
+    tetrahedral = iccToTRC(synthProfiles[kind], known=False)
+    trilinear = iccToTRC(synthProfiles[kind], known=False, clutMethod='trilinear')
+    assert np.allclose(trilinear.trcDecode(pixels), tetrahedral.trcDecode(pixels), rtol=0, atol=1e-4)
+
+
+@pytest.mark.parametrize('method', ['tetrahedral', 'trilinear'])
+def test_identityCLUT(pixels, method):
+    grid = np.linspace(0, 1, 9)
+    table = np.stack(np.meshgrid(grid, grid, grid, indexing='ij'), axis=-1)
+    flat = pixels.reshape(-1, 3)
+
+    assert np.allclose(iccCLUT(table, method).apply(flat), flat, rtol=0, atol=1e-12)
+    assert np.allclose(iccCLUT.identity(method).apply(flat), flat, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('kind, bakeGrid, bakeShaper, atol', [
+    ('mAB', 33, '', 1e-3),
+    ('mAB', 65, '', 5e-4),
+    ('mAB', 33, 'A', 1e-12),
+    ('pq', 65, '', 5e-3),
+    ('pq', 33, 'A', 1e-12),
+])
+def test_bakedMatchesUnbaked(synthProfiles, pixels, kind, bakeGrid, bakeShaper, atol):
+    unbaked = iccToTRC(synthProfiles[kind], known=False)
+    baked = iccToTRC(synthProfiles[kind], known=False, bakeGrid=bakeGrid, bakeShaper=bakeShaper)
+
+    assert baked.a2b0_Baked is not None
+    assert np.allclose(baked.trcDecode(pixels), unbaked.trcDecode(pixels), rtol=0, atol=atol)
+
+    encoded = np.round(pixels * 255).astype(np.uint8)
+    assert np.allclose(baked.trcDecodeInt(encoded), baked.trcDecode(encoded / 255), rtol=0, atol=1e-12)
+
+
+def test_bakeShaperNeedsGrid(synthProfiles):
+    with pytest.raises(Exception, match='bakeGrid'):
+        iccToTRC(synthProfiles['mAB'], bakeShaper='A')
+
+
+def test_chromaticityMatchesXYZ(synthProfiles, pixels):
+    prf = iccToTRC(synthProfiles['mAB'])
+    XYZ = prf.trcDecode(pixels) @ prf.rgbToXYZMatrix().T
+
+    xy = prf.trcDecodeChromaticity(pixels)
+    assert np.allclose(xy, XYZ[..., :2] / XYZ.sum(axis=-1, keepdims=True), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('profile, message', [
+    (b'\x00' * 200, 'not a valid ICC profile'),
+    (iccProfileGen.synthProfile('para')[:140], 'does not fit'),
+])
+def test_invalidHeader(profile, message):
+    with pytest.raises(Exception, match=message):
+        iccToTRC(profile)
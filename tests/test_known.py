@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from icctotrcMP import iccToTRC
+
+from conftest import d50SRGBProfile, mixedPQProfile, synthKinds
+
+
+def test_mixingCLUTIsNotKnown(pixels):
+    # right primaries, white and curves, but the CLUT mixes channels: no match, and the
+    # generic decode keeps the mixing
+    profile = mixedPQProfile()
+    prf = iccToTRC(profile)
+    generic = iccToTRC(profile, known=False)
+
+    assert prf.prfKnown == ''
+    assert np.array_equal(prf.trcDecode(pixels), generic.trcDecode(pixels))
+
+
+def test_d50WhiteIsNotKnown():
+    assert iccToTRC(d50SRGBProfile()).prfKnown == ''
+
+
+def test_memoKeepsMatchesAndMisses(synthProfiles):
+    for kind in ('sRGB', 'para'):
+        iccToTRC(synthProfiles[kind])
+
+    assert iccToTRC.knownLookup(iccToTRC.profileDigest(synthProfiles['sRGB'])) == (True, ('sRGB', 'sRGB', 1.0))
+    assert iccToTRC.knownLookup(iccToTRC.profileDigest(synthProfiles['para'])) == (True, None)
+    assert iccToTRC.knownLookup('0' * 64) == (False, None)
+
+
+def test_memoIsBounded(synthProfiles, monkeypatch):
+    monkeypatch.setattr(iccToTRC, 'knownDigestsMax', 2)
+    for kind in ('sRGB', 'para', 'mAB'):
+        iccToTRC(synthProfiles[kind])
+
+    assert list(iccToTRC.knownDigests) == [iccToTRC.profileDigest(synthProfiles[x]) for x in ('para', 'mAB')]
+
+
+def test_memoizedA2B0SkipsCLUT(synthProfiles, pixels):
+    first = iccToTRC(synthProfiles['pq'])
+    second = iccToTRC(synthProfiles['pq'])
+
+    assert second.prfKnown == 'ITU-R BT.2100 PQ'
+    assert not hasattr(second, 'a2b0_LUTapp')
+    assert np.array_equal(second.trcDecode(pixels), first.trcDecode(pixels))
+
+
+@pytest.mark.parametrize('kind', synthKinds)
+def test_fingerprintTagsAgreesForMatrixTRC(synthProfiles, kind):
+    prf = iccToTRC(synthProfiles[kind], lazy=True)
+    expected = iccToTRC(synthProfiles[kind]).prfKnown if prf.prfType == 'std' else ''
+
+    assert prf.fingerprintTags() == expected
+    assert not prf.isMaterialized
+
+
+def test_fingerprintTagsRejectsD50White():
+    assert iccToTRC(d50SRGBProfile(), lazy=True).fingerprintTags() == ''